@@ -1,7 +1,10 @@
 from typing import Dict, Any, Optional
+import asyncio
 import time
 from playwright.sync_api import Page
 
+from snapshot import ref_selector
+
 class ActionExecutor:
     """Executes high-level actions (click, type …) on a Playwright Page."""
 
@@ -56,13 +59,15 @@ class ActionExecutor:
         if text:
             strategies.append(f'text="{text}"')
         if ref:
-            strategies.append(f"[aria-ref='{ref}']")
+            strategies.append(ref_selector(ref))
 
         for sel in strategies:
             try:
-                if self.page.locator(sel).count() > 0:
-                    self.page.click(sel, timeout=5000, force=True)
-                    return f"Clicked element via {sel}"
+                # No count() precheck - that costs a full selector query
+                # just to re-run the same selector for the click. One
+                # attempt with a short timeout raises fast on a miss.
+                self.page.click(sel, timeout=1500, force=True)
+                return f"Clicked element via {sel}"
             except Exception:
                 pass
         return "Error: Could not click element"
@@ -73,7 +78,7 @@ class ActionExecutor:
         text = action.get("text", "")
         if not (ref or selector):
             return "Error: type requires ref/selector"
-        target = selector or f"[aria-ref='{ref}']"
+        target = selector or ref_selector(ref)
         try:
             self.page.fill(target, text, timeout=5000)
             return f"Typed '{text}' into {target}"
@@ -86,7 +91,7 @@ class ActionExecutor:
         value = action.get("value", "")
         if not (ref or selector):
             return "Error: select requires ref/selector"
-        target = selector or f"[aria-ref='{ref}']"
+        target = selector or ref_selector(ref)
         try:
             self.page.select_option(target, value, timeout=10000)
             return f"Selected '{value}' in {target}"
@@ -108,7 +113,7 @@ class ActionExecutor:
         ref = action.get("ref")
         if not ref:
             return "Error: extract requires ref"
-        target = f"[aria-ref='{ref}']"
+        target = ref_selector(ref)
         self.page.wait_for_selector(target, timeout=10000)
         txt = self.page.text_content(target)
         return f"Extracted: {txt[:100] if txt else 'None'}"
@@ -124,7 +129,7 @@ class ActionExecutor:
         ref = action.get("ref")
         selector = action.get("selector")
         if ref:
-            self.page.focus(f"[aria-ref='{ref}']")
+            self.page.focus(ref_selector(ref))
         elif selector:
             self.page.focus(selector)
         self.page.keyboard.press("Enter")
@@ -142,4 +147,150 @@ class ActionExecutor:
     @staticmethod
     def should_update_snapshot(action: Dict[str, Any]) -> bool:
         change_types = {"click", "type", "select", "scroll", "navigate", "enter"}
-        return action.get("type") in change_types 
\ No newline at end of file
+        return action.get("type") in change_types
+
+    @staticmethod
+    def affects_dom(action: Dict[str, Any]) -> bool:
+        """Whether the action can plausibly produce a structural diff.
+
+        Pure-timeout waits never do, and a scroll that stays within one
+        viewport only moves the window; capturing a snapshot after those
+        is a wasted DOM walk.
+        """
+        action_type = action.get("type")
+        if action_type == "wait":
+            # Waiting *for a selector* implies the page is expected to change.
+            return "selector" in action
+        if action_type == "scroll":
+            return action.get("amount", 300) > 800
+        return True
+
+
+class AsyncActionExecutor(ActionExecutor):
+    """ActionExecutor variant driving a `playwright.async_api` Page."""
+
+    async def execute(self, action: Dict[str, Any]) -> str:
+        if not action:
+            return "No action to execute"
+
+        action_type = action.get("type")
+        if not action_type:
+            return "Error: action has no type"
+
+        try:
+            # small helper to ensure basic stability
+            await self._wait_dom_stable()
+
+            handler = {
+                "click": self._click,
+                "type": self._type,
+                "select": self._select,
+                "wait": self._wait,
+                "extract": self._extract,
+                "scroll": self._scroll,
+                "enter": self._enter,
+            }.get(action_type)
+
+            if handler is None:
+                return f"Error: Unknown action type '{action_type}'"
+
+            return await handler(action)
+        except Exception as exc:
+            return f"Error executing {action_type}: {exc}"
+
+    # ------------------------------------------------------------------
+    # Internal handlers (async mirrors of the sync versions above)
+    # ------------------------------------------------------------------
+    async def _click(self, action):
+        ref = action.get("ref")
+        text = action.get("text")
+        selector = action.get("selector")
+        if not (ref or text or selector):
+            return "Error: click requires ref/text/selector"
+
+        strategies = []
+        if selector:
+            strategies.append(selector)
+        if text:
+            strategies.append(f'text="{text}"')
+        if ref:
+            strategies.append(ref_selector(ref))
+
+        for sel in strategies:
+            try:
+                await self.page.click(sel, timeout=1500, force=True)
+                return f"Clicked element via {sel}"
+            except Exception:
+                pass
+        return "Error: Could not click element"
+
+    async def _type(self, action):
+        ref = action.get("ref")
+        selector = action.get("selector")
+        text = action.get("text", "")
+        if not (ref or selector):
+            return "Error: type requires ref/selector"
+        target = selector or ref_selector(ref)
+        try:
+            await self.page.fill(target, text, timeout=5000)
+            return f"Typed '{text}' into {target}"
+        except Exception as exc:
+            return f"Type failed: {exc}"
+
+    async def _select(self, action):
+        ref = action.get("ref")
+        selector = action.get("selector")
+        value = action.get("value", "")
+        if not (ref or selector):
+            return "Error: select requires ref/selector"
+        target = selector or ref_selector(ref)
+        try:
+            await self.page.select_option(target, value, timeout=10000)
+            return f"Selected '{value}' in {target}"
+        except Exception as exc:
+            return f"Select failed: {exc}"
+
+    async def _wait(self, action):
+        if "timeout" in action:
+            ms = action["timeout"]
+            await asyncio.sleep(ms / 1000)
+            return f"Waited {ms}ms"
+        if "selector" in action:
+            sel = action["selector"]
+            await self.page.wait_for_selector(sel, timeout=10000)
+            return f"Waited for {sel}"
+        return "Error: wait requires timeout/selector"
+
+    async def _extract(self, action):
+        ref = action.get("ref")
+        if not ref:
+            return "Error: extract requires ref"
+        target = ref_selector(ref)
+        await self.page.wait_for_selector(target, timeout=10000)
+        txt = await self.page.text_content(target)
+        return f"Extracted: {txt[:100] if txt else 'None'}"
+
+    async def _scroll(self, action):
+        direction = action.get("direction", "down")
+        amount = action.get("amount", 300)
+        await self.page.evaluate(f"window.scrollBy(0, {amount if direction=='down' else -amount})")
+        await asyncio.sleep(0.5)
+        return f"Scrolled {direction} by {amount}px"
+
+    async def _enter(self, action):
+        ref = action.get("ref")
+        selector = action.get("selector")
+        if ref:
+            await self.page.focus(ref_selector(ref))
+        elif selector:
+            await self.page.focus(selector)
+        await self.page.keyboard.press("Enter")
+        await asyncio.sleep(0.3)
+        return "Pressed Enter"
+
+    # utilities
+    async def _wait_dom_stable(self):
+        try:
+            await self.page.wait_for_load_state('domcontentloaded', timeout=3000)
+        except Exception:
+            pass
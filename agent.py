@@ -1,49 +1,253 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Callable, List, Optional
+import asyncio
+from collections import deque
+import atexit
 import json
+import logging
+import sys
 from pathlib import Path
 
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 
-from snapshot import PageSnapshot
-from actions import ActionExecutor
-from chat_py import chat_single, message_template, print_color
+try:
+    import orjson  # optional – faster JSON encoding for console logging
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec  # optional – C-accelerated decoding of LLM replies
+except ImportError:
+    msgspec = None
+
+from snapshot import AsyncPageSnapshot
+from actions import AsyncActionExecutor
+from chat_py import chat_single, chat_stream, extract_json_value, message_template
+
+
+# Step output goes through one logger record per block (header + multi-KB
+# body in a single stream write) instead of several unbuffered prints,
+# which can stall the loop on slow consoles.
+logger = logging.getLogger("playwright_dom_agent")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# ANSI codes matching chat_py.print_color, inlined so a colored block is
+# still a single write.
+_GREEN, _BLUE, _RESET = "\033[32m", "\033[34m", "\033[0m"
+
+
+def _decode_json(text: str) -> Any:
+    """Decode an LLM JSON reply, via msgspec's C decoder when installed."""
+    if msgspec is not None:
+        return msgspec.json.decode(text)
+    return json.loads(text)
+
+
+# ----------------------------------------------------------------------
+# Warm-browser pool: `close()` parks the context here instead of tearing
+# it down, and the next agent with the same launch options reuses it –
+# skipping the Chromium cold-start (~0.5-2s per session).
+# ----------------------------------------------------------------------
+_BROWSER_POOL: List[Dict[str, Any]] = []
+
+
+async def _drain_pool():
+    while _BROWSER_POOL:
+        entry = _BROWSER_POOL.pop()
+        try:
+            await entry["context"].close()
+        except Exception:
+            pass
+        try:
+            browser = entry.get("browser")
+            if browser and browser.is_connected():
+                await browser.close()
+        except Exception:
+            pass
+        try:
+            await entry["playwright"].stop()
+        except Exception:
+            pass
+
+
+def _drain_pool_at_exit():
+    if not _BROWSER_POOL:
+        return
+    try:
+        asyncio.run(_drain_pool())
+    except Exception:
+        pass
+
+
+atexit.register(_drain_pool_at_exit)
 
 
 class PlaywrightLLMAgent:
-    """High-level orchestration: snapshot ↔ LLM ↔ action executor."""
-
-    def __init__(self, *, user_data_dir: Optional[str] = None, headless: bool = False):
-        self.playwright = sync_playwright().start()
-
-        # --------------------------------------------------
-        # Browser / context
-        # --------------------------------------------------
-        if user_data_dir:
-            Path(user_data_dir).mkdir(parents=True, exist_ok=True)
-            self.context = self.playwright.chromium.launch_persistent_context(user_data_dir=user_data_dir, headless=headless)
-            self.browser = self.context.browser
-        else:
-            self.browser = self.playwright.chromium.launch(headless=headless)
-            self.context = self.browser.new_context()
+    """High-level orchestration: snapshot ↔ LLM ↔ action executor.
+
+    Built on `playwright.async_api` so browser work (action execution,
+    diff capture) can overlap with LLM network round trips instead of
+    strictly serializing them.
+    """
+
+    def __init__(self, *, user_data_dir: Optional[str] = None, headless: bool = False,
+                 verbose: bool = True, cdp_endpoint: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        cdp_endpoint : str, optional
+            CDP URL of an already-running Chromium (e.g. "http://localhost:9222").
+            Connecting to a warm browser skips both the process cold-start and
+            the profile replay that `launch_persistent_context` pays each run.
+            Start the browser once with::
+
+                chromium --remote-debugging-port=9222 --user-data-dir=/path/to/profile
+        """
+        self._user_data_dir = user_data_dir
+        self._headless = headless
+        self._cdp_endpoint = cdp_endpoint
+        # Console logging costs real time for multi-KB snapshots/responses;
+        # pay for the serialization only when someone is watching.
+        self.verbose = verbose
+
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+
+        # helpers (bound to the page once `start()` has run)
+        self.snapshot: Optional[AsyncPageSnapshot] = None
+        self.executor: Optional[AsyncActionExecutor] = None
+        # Only the last _HISTORY_KEEP actions are kept (and sent) verbatim;
+        # older entries collapse into a rolling one-line summary so the
+        # prompt's history block stays O(K) instead of growing per step.
+        self.action_history: deque = deque(maxlen=self._HISTORY_KEEP)
+        # Pre-formatted history lines, appended once per executed action so
+        # _llm_call does not rebuild the whole block every step.
+        self._history_buf: deque = deque(maxlen=self._HISTORY_KEEP)
+        self._evicted_counts: Dict[str, int] = {}
+        self._evicted_failures = 0
+        self._step_no = 0
+
+        # Local completion checks, evaluated on (action, result, prompt)
+        # after each step. When one fires we synthesize a finish action
+        # and skip the LLM round trip that would only confirm it.
+        self._terminal_predicates: List[Callable[[Dict[str, Any], str, str], bool]] = [
+            self._navigate_only_task_done,
+        ]
+
+        # Action types the agent routes itself; everything else goes to
+        # the executor. Hashed lookup instead of an if/elif chain.
+        self._action_routes = {
+            "navigate": lambda action: self.navigate(action.get("url", "")),
+        }
+
+        # Build the (byte-identical) system message once – repeating the
+        # exact same prefix every step also lets provider-side prompt
+        # caching actually hit.
+        self._system_msg = message_template(
+            "system",
+            self._SYSTEM_BASE + self._SYSTEM_DETAIL + "\n" + self._ACTION_TYPES_DOC)
 
-        self.page = self.context.new_page()
+    # ------------------------------------------------------------------
+    # Browser lifecycle
+    # ------------------------------------------------------------------
+    @classmethod
+    async def from_pool(cls, *, user_data_dir: Optional[str] = None, headless: bool = False) -> "PlaywrightLLMAgent":
+        """Create a started agent, reusing a pooled warm context when available."""
+        agent = cls(user_data_dir=user_data_dir, headless=headless)
+        await agent.start()
+        return agent
+
+    async def start(self):
+        """Launch the browser / context. Called lazily by the public API."""
+        if self.page is not None:
+            return
+
+        # Reuse a parked context with the same launch options if one exists.
+        pool_key = (self._user_data_dir, self._headless, self._cdp_endpoint)
+        for i, entry in enumerate(_BROWSER_POOL):
+            if entry["key"] == pool_key:
+                entry = _BROWSER_POOL.pop(i)
+                self.playwright = entry["playwright"]
+                self.browser = entry["browser"]
+                self.context = entry["context"]
+                break
+        else:
+            self.playwright = await async_playwright().start()
+
+            # --------------------------------------------------
+            # Browser / context
+            # --------------------------------------------------
+            if self._cdp_endpoint:
+                # Attach to an already-warm Chromium over CDP instead of
+                # launching (and replaying the profile of) a fresh one.
+                self.browser = await self.playwright.chromium.connect_over_cdp(self._cdp_endpoint)
+                self.context = self.browser.contexts[0] if self.browser.contexts else await self.browser.new_context()
+            elif self._user_data_dir:
+                Path(self._user_data_dir).mkdir(parents=True, exist_ok=True)
+                self.context = await self.playwright.chromium.launch_persistent_context(user_data_dir=self._user_data_dir, headless=self._headless)
+                self.browser = self.context.browser
+            else:
+                self.browser = await self.playwright.chromium.launch(headless=self._headless)
+                self.context = await self.browser.new_context()
+
+        from snapshot import _DOM_REV_JS, _FALLBACK_SNAP_JS
+        await asyncio.gather(
+            self.context.add_init_script(_DOM_REV_JS),
+            self.context.add_init_script(_FALLBACK_SNAP_JS),
+            self.context.add_init_script(
+                AsyncPageSnapshot._install_snapshot_js()))
+        self.page = await self.context.new_page()
+
+        self.snapshot = AsyncPageSnapshot(self.page)
+        self.executor = AsyncActionExecutor(self.page)
+
+    async def reset(self):
+        """Reuse the same browser for a fresh task instead of relaunching."""
+        await self.start()
+
+        async def _clear_cookies():
+            try:
+                await self.context.clear_cookies()
+            except Exception:
+                pass
 
-        # helpers
-        self.snapshot = PageSnapshot(self.page)
-        self.executor = ActionExecutor(self.page)
-        self.action_history: List[Dict[str, Any]] = []
+        # Cookie wipe and the blank navigation are independent - overlap them.
+        await asyncio.gather(_clear_cookies(), self.page.goto("about:blank"))
+        self.action_history.clear()
+        self._history_buf.clear()
+        self._evicted_counts.clear()
+        self._evicted_failures = 0
+        self._step_no = 0
 
     # ------------------------------------------------------------------
     # Navigation & snapshot helpers
     # ------------------------------------------------------------------
-    def navigate(self, url: str) -> str:
+    async def navigate(self, url: str, ready_selector: Optional[str] = None,
+                       ready_js: Optional[str] = None) -> str:
+        """Navigate and capture a fresh snapshot.
+
+        `networkidle` is deliberately not used – pages with long-lived
+        analytics beacons routinely burn its whole timeout. Callers that
+        need a readiness signal pass a selector or a JS predicate instead;
+        otherwise `domcontentloaded` is considered good enough.
+        """
+        await self.start()
         try:
-            self.page.goto(url, wait_until="domcontentloaded", timeout=20000)
+            await self.page.goto(url, wait_until="domcontentloaded", timeout=20000)
             try:
-                self.page.wait_for_load_state("networkidle", timeout=5000)
+                if ready_selector:
+                    await self.page.wait_for_selector(ready_selector, timeout=5000)
+                elif ready_js:
+                    await self.page.wait_for_function(ready_js, timeout=5000)
             except Exception:
                 pass
-            return self.snapshot.capture(force_refresh=True)
+            return await self.snapshot.capture(force_refresh=True)
         except Exception as exc:
             return f"Error: could not navigate – {exc}"
 
@@ -59,23 +263,26 @@ Available action types:
 - 'scroll': {"type": "scroll", "direction": "down", "amount": 300}
 - 'enter': {"type": "enter", "ref": "e1"} or {"type": "enter", "selector": "input[name=q]"} or {"type": "enter"}
 - 'navigate': {"type": "navigate", "url": "https://example.com"}
+- 'refresh_snapshot': {"type": "refresh_snapshot"} or {"type": "refresh_snapshot", "full": true}
 - 'finish': {"type": "finish", "ref": null, "summary": "task completion summary"}
 
-IMPORTANT: 
+IMPORTANT:
 - For 'click': Use 'ref' from snapshot, or 'text' for visible text, or 'selector' for CSS selectors
 - For 'type'/'select': Use 'ref' from snapshot or 'selector' for CSS selectors
 - Only use 'ref' values that exist in the snapshot (e.g., ref=e1, ref=e2, etc.)
 - Use 'finish' when the task is completed successfully with a summary of what was accomplished
 - Use 'enter' to press the Enter key (optionally focus an element first)
 - Use 'navigate' to open a new URL before interacting further
+- Use 'refresh_snapshot' if you cannot decide without seeing the full current page snapshot again
 - click can choose radio, checkbox...
 """
 
-    def _llm_call(self, prompt: str, snapshot: str, is_initial: bool, history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
-        system_base = "You are a web automation assistant."
+    # Verbatim history entries kept in the prompt; older steps are summarized.
+    _HISTORY_KEEP = 8
 
+    _SYSTEM_BASE = "You are a web automation assistant."
 
-        system_detail = """
+    _SYSTEM_DETAIL = """
                 " Analyse the page snapshot and create a short high-level plan, "
                 "then output the FIRST action to start with.\n\n"
                 "Return a JSON object in *exactly* this shape:\n"
@@ -96,102 +303,305 @@ If task is already complete:
     "ref": null,
     "summary": "Task was already completed. Summary of what was found..."
   }
+}
+
+If several next steps are already certain (e.g. type then press enter),
+return them all at once as an "actions" list instead of a single "action":
+{
+  "plan": ["Step 1", "Step 2"],
+  "actions": [
+    {"type": "type", "ref": "e1", "text": "apple"},
+    {"type": "enter"}
+  ]
+}
+Only batch actions whose refs are already visible in the current snapshot.
 
 
 """
 
-        system = system_base + system_detail + "\n" + self._ACTION_TYPES_DOC
+    async def _llm_call(self, prompt: str, snapshot: str, is_initial: bool,
+                        snapshot_is_diff: bool = False,
+                        no_change: bool = False) -> Dict[str, Any]:
+        # Stable-prefix ordering: the task is fixed for the session and the
+        # history only grows, so they lead; the snapshot (different every
+        # turn) trails, keeping the cacheable prefix as long as possible.
         if is_initial:
-            user = f"Snapshot:\n{snapshot}\n\nTask: {prompt}"
+            user = f"Task: {prompt}\n\nSnapshot:\n{snapshot}"
+        elif no_change:
+            # No-change fast path: the page is exactly what the LLM already
+            # saw, so resending any snapshot would be pure token overhead.
+            user = (f"Task: {prompt}\n\nHistory:\n" + self._history_text() +
+                    "\n\nThe page is unchanged since the last snapshot you saw "
+                    "(reply with a refresh_snapshot action if you still need it).")
         else:
-            hist_lines = [
-                f"{i+1}. {'✅' if h['success'] else '❌'} {h['action']['type']} -> {h['result']}"
-                for i, h in enumerate(history or [])
-            ]
-            user = f"Snapshot:\n{snapshot}\n\nHistory:\n" + "\n".join(hist_lines) + f"\n\nTask: {prompt}"
-        messages = [message_template("system", system), message_template("user", user)]
-        resp = chat_single(messages, mode="json", verbose=False)
-        print_color(resp,'blue')
+            header = (
+                f"Snapshot (diff since step {self._step_no}, against the last full snapshot you saw):"
+                if snapshot_is_diff else "Snapshot:")
+            user = (f"Task: {prompt}\n\nHistory:\n" + self._history_text() +
+                    f"\n\n{header}\n{snapshot}")
+        messages = [self._system_msg, message_template("user", user)]
+        # The LLM call is a blocking HTTP round trip – run it off-loop so
+        # browser work can proceed while we wait on the network.
+        try:
+            resp = await asyncio.to_thread(self._consume_stream, messages)
+        except Exception:
+            # Streaming hiccup – fall back to the plain JSON call.
+            resp = await asyncio.to_thread(chat_single, messages, mode="json", verbose=False)
+        if self.verbose:
+            logger.info("%s%s%s", _BLUE, resp, _RESET)
         return resp if isinstance(resp, dict) else {}
 
+    @staticmethod
+    def _consume_stream(messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Consume a streamed JSON response, returning as soon as the action
+        field is complete instead of waiting for the document's closing brace.
+
+        The plan usually arrives before the action, so it is picked up from
+        the same buffer; whatever would have streamed after the action (often
+        hundreds of ms of decode tail) is skipped by closing the stream.
+        """
+        buf: List[str] = []
+        stream = chat_stream(messages)
+        try:
+            for delta in stream:
+                buf.append(delta)
+                # The action value can only have closed on a chunk that
+                # contains a closing bracket.
+                if '}' not in delta and ']' not in delta:
+                    continue
+                text = "".join(buf)
+                for key in ("actions", "action"):
+                    value = extract_json_value(text, key)
+                    if value is not None:
+                        resp: Dict[str, Any] = {key: value}
+                        plan = extract_json_value(text, "plan")
+                        if plan is not None:
+                            resp["plan"] = plan
+                        return resp
+        finally:
+            stream.close()
+        # Stream ended without an early hit – parse the whole document.
+        try:
+            return _decode_json("".join(buf))
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _dumps_pretty(obj: Any) -> str:
+        if orjson is not None:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+
     # ------------------------------------------------------------------
     # Top-level command loop
     # ------------------------------------------------------------------
-    def process_command(self, prompt: str, max_steps: int = 15):
+    async def process_command(self, prompt: str, max_steps: int = 15):
+        await self.start()
+
         # Initial full snapshot (cache logic removed in PageSnapshot)
-        full_snapshot = self.snapshot.capture()
-        print("[Snapshot FULL]")
-        print_color(full_snapshot, "green")
+        full_snapshot = await self.snapshot.capture()
+        if self.verbose:
+            logger.info("[Snapshot FULL]\n%s%s%s", _GREEN, full_snapshot, _RESET)
 
-        plan_resp = self._llm_call(prompt, full_snapshot or "", is_initial=True)
+        plan_resp = await self._llm_call(prompt, full_snapshot or "", is_initial=True)
         plan = plan_resp.get("plan", [])
-        action = plan_resp.get("action")
+        queue = self._queued_actions(plan_resp)
 
-        print("Plan:", json.dumps(plan, indent=2, ensure_ascii=False))
+        if self.verbose:
+            logger.info("Plan: %s", self._dumps_pretty(plan))
 
         steps = 0
-        while action and steps < max_steps:
+        while queue and steps < max_steps:
+            action = queue.pop(0)
             if action.get("type") == "finish":
-                print("🎉", action.get("summary", "Done"))
+                logger.info("🎉 %s", action.get("summary", "Done"))
                 break
 
-            result = self._run_action(action)
-            print(f"\n➡ Executed: {action}\n   Result: {result}")
-
-            self.action_history.append({"action": action, "result": result, "success": "Error" not in result})
+            # The LLM explicitly asked to see the current page again
+            # (typically after a no-change fast-path turn).
+            if action.get("type") == "refresh_snapshot":
+                # Default to the compact element-only view; the full page is
+                # sent only when the model explicitly asks for it.
+                mode = "full" if action.get("full") else "refs_only"
+                refreshed = await self.snapshot.capture(force_refresh=True, mode=mode)
+                full_snapshot = self.snapshot.snapshot_data or refreshed
+                plan_resp = await self._llm_call(prompt, refreshed or "", is_initial=False)
+                queue = self._queued_actions(plan_resp)
+                steps += 1
+                continue
+
+            result = await self._run_action(action)
+            if self.verbose:
+                logger.info("\n➡ Executed: %s\n   Result: %s", action, result)
+
+            success = "Error" not in result
+            self._step_no += 1
+            if len(self.action_history) == self.action_history.maxlen:
+                evicted = self.action_history[0]
+                etype = evicted["action"].get("type", "?")
+                self._evicted_counts[etype] = self._evicted_counts.get(etype, 0) + 1
+                if not evicted["success"]:
+                    self._evicted_failures += 1
+            self.action_history.append({"action": action, "result": result, "success": success})
+            self._history_buf.append(
+                f"{self._step_no}. {'✅' if success else '❌'} {action['type']} -> {result}")
+
+            # Local completion check: skip the LLM entirely when the result
+            # already proves the task is done.
+            if any(pred(action, result, prompt) for pred in self._terminal_predicates):
+                queue = [{"type": "finish", "ref": None, "summary": result}]
+                steps += 1
+                continue
+
+            # Cheap actions (pure-timeout waits, in-viewport scrolls) cannot
+            # change the DOM in a way worth re-walking it for.
+            capture_diff = AsyncActionExecutor.affects_dom(action)
+
+            if queue:
+                # Batched mode: keep draining the queued actions locally
+                # and only go back to the LLM when a page change actually
+                # invalidates a ref the remaining actions depend on.
+                if capture_diff:
+                    diff_snapshot = await self.snapshot.capture(
+                        force_refresh=AsyncActionExecutor.should_update_snapshot(action),
+                        diff_only=True)
+                else:
+                    diff_snapshot = "- Page Snapshot (no-op action, capture skipped)"
+                is_diff = diff_snapshot.startswith("- Page Snapshot (diff)")
+                if self.verbose:
+                    logger.info("[Snapshot %s]\n%s%s%s",
+                                'DIFF' if is_diff else 'NO-CHANGE',
+                                _GREEN, diff_snapshot, _RESET)
+                if is_diff:
+                    full_snapshot = self.snapshot.snapshot_data
+                    if not self._refs_still_valid(queue, full_snapshot or ""):
+                        if self.verbose:
+                            logger.info("Queued actions invalidated by page change, re-planning…")
+                        queue.clear()
+                        plan_resp = await self._llm_call(prompt, diff_snapshot, is_initial=False, snapshot_is_diff=True)
+                        queue = self._queued_actions(plan_resp)
+            else:
+                # Speculatively plan the next step against the pre-action
+                # snapshot while the diff capture runs. If the page turns
+                # out unchanged the speculative answer is used as-is; when
+                # it did change, the stale task is cancelled immediately
+                # (no point waiting for an answer we will discard) and we
+                # re-plan against the delta. LLM latency is thus hidden
+                # behind DOM settle time on no-change steps.
+                pending_llm = asyncio.create_task(
+                    self._llm_call(prompt, "", is_initial=False, no_change=True))
+                if capture_diff:
+                    diff_snapshot = await self.snapshot.capture(
+                        force_refresh=AsyncActionExecutor.should_update_snapshot(action),
+                        diff_only=True)
+                else:
+                    diff_snapshot = "- Page Snapshot (no-op action, capture skipped)"
+
+                # Determine if actual diff content exists
+                is_diff = diff_snapshot.startswith("- Page Snapshot (diff)")
+                if self.verbose:
+                    logger.info("[Snapshot %s]\n%s%s%s",
+                                'DIFF' if is_diff else 'NO-CHANGE',
+                                _GREEN, diff_snapshot, _RESET)
+
+                if is_diff:
+                    pending_llm.cancel()
+                    full_snapshot = self.snapshot.snapshot_data
+                    plan_resp = await self._llm_call(prompt, diff_snapshot, is_initial=False, snapshot_is_diff=True)
+                else:
+                    plan_resp = await pending_llm
+
+                queue = self._queued_actions(plan_resp)
 
-            diff_snapshot = self.snapshot.capture(
-                force_refresh=ActionExecutor.should_update_snapshot(action),
-                diff_only=True)
-
-            # Determine if actual diff content exists
-            is_diff = diff_snapshot.startswith("- Page Snapshot (diff)")
-            print(f"[Snapshot {'DIFF' if is_diff else 'NO-CHANGE'}]")
-            print_color(diff_snapshot, "green")
+            steps += 1
 
-            # Update stored full snapshot when there are structural changes
-            if is_diff:
-                full_snapshot = self.snapshot.snapshot_data
+    # ------------------------------------------------------------------
+    def _history_text(self) -> str:
+        """Recent history lines, prefixed with a summary of evicted steps."""
+        lines = list(self._history_buf)
+        if self._evicted_counts:
+            total = sum(self._evicted_counts.values())
+            parts = ", ".join(f"{n}×{t}" for t, n in self._evicted_counts.items())
+            failed = f", {self._evicted_failures} failed" if self._evicted_failures else ""
+            lines.insert(0, f"[{total} earlier actions omitted: {parts}{failed}]")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _navigate_only_task_done(action: Dict[str, Any], result: str, prompt: str) -> bool:
+        """A task that is just 'open this URL' is done once navigation worked."""
+        url = action.get("url", "")
+        return (action.get("type") == "navigate" and bool(url)
+                and "Error" not in result and prompt.strip().startswith(url))
+
+    @staticmethod
+    def _queued_actions(plan_resp: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Normalize an LLM response into a list of pending actions."""
+        actions = plan_resp.get("actions")
+        if isinstance(actions, list) and actions:
+            return [a for a in actions if isinstance(a, dict)]
+        action = plan_resp.get("action")
+        return [action] if isinstance(action, dict) else []
 
-            action = self._llm_call(prompt, full_snapshot or "", is_initial=False, history=self.action_history).get("action")
-            steps += 1
+    @staticmethod
+    def _refs_still_valid(actions: List[Dict[str, Any]], snapshot_text: str) -> bool:
+        """True while every ref the queued actions rely on still exists."""
+        for act in actions:
+            ref = act.get("ref")
+            if ref and f"[ref={ref}]" not in snapshot_text:
+                return False
+        return True
 
     # ------------------------------------------------------------------
-    def _run_action(self, action: Dict[str, Any]) -> str:
-        if action.get("type") == "navigate":
-            return self.navigate(action.get("url", ""))
-        return self.executor.execute(action)
+    async def _run_action(self, action: Dict[str, Any]) -> str:
+        handler = self._action_routes.get(action.get("type"))
+        if handler is not None:
+            return await handler(action)
+        return await self.executor.execute(action)
 
     # ------------------------------------------------------------------
-    def close(self):
-        try:
-            self.context.close()
-        except Exception:
-            pass
+    async def close(self):
+        """Close the page and park the warm context in the module pool.
+
+        The pooled context (and its Chromium process) is torn down by the
+        atexit drain, or explicitly via `_drain_pool()`.
+        """
         try:
-            browser = getattr(self, "browser", None)
-            if browser and getattr(browser, "is_connected", lambda: False)():
-                browser.close()
+            if self.page:
+                await self.page.close()
         except Exception:
             pass
-        self.playwright.stop()
+        if self.context is not None:
+            _BROWSER_POOL.append({
+                "key": (self._user_data_dir, self._headless, self._cdp_endpoint),
+                "playwright": self.playwright,
+                "browser": self.browser,
+                "context": self.context,
+            })
+        self.page = None
+        self.context = None
+        self.browser = None
+        self.playwright = None
 
 
 # ----------------------------------------------------------------------
 # Example usage
 # ----------------------------------------------------------------------
-if __name__ == "__main__":
-    agent = PlaywrightLLMAgent(headless=False,user_data_dir="D:/User_Data")
+async def _main():
+    agent = PlaywrightLLMAgent(headless=False, user_data_dir="D:/User_Data")
     try:
-        agent.process_command("""
+        await agent.process_command("""
         https://www.nytimes.com/games/wordle/index.html
 玩一下这个游戏，你需要输入有意义的5个字母的单词，第一次输入apple
 输入的时候add e 按钮就是输入e字母，add a 就是输入a
-img "1st letter, E" 代表你输入的第一个字母是e 
+img "1st letter, E" 代表你输入的第一个字母是e
 要观察之前点击了哪些字母，然后凑出有意义的5字母单词
 必须要有意义，不是随便输入5个字母
 总共尝试输入5次
-        
+
         """)
     finally:
-        agent.close()
\ No newline at end of file
+        await agent.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
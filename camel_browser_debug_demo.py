@@ -79,6 +79,29 @@ class BrowserDebugDemo:
         self.session_dir = self.cache_dir / f"session_{self.session_id}"
         self.session_dir.mkdir(exist_ok=True)
 
+        # Last unified analysis, keyed by (url, dom size) so repeated
+        # click/debug commands on an unchanged page skip the DOM re-walk.
+        self._analysis_cache: Optional[Tuple[str, int, Dict]] = None
+
+        # Keep the command log open for the whole session instead of
+        # re-opening (and re-seeking) the file for every command.
+        self._log_file = open(self.session_dir / "command_log.txt", 'a',
+                              encoding='utf-8', buffering=8192)
+
+        # O(1) hashed command dispatch instead of a linear if/elif chain.
+        self._handlers = {
+            'navigate': self._cmd_navigate,
+            'click': self._cmd_click,
+            'type': self._cmd_type,
+            'select': self._cmd_select,
+            'snapshot': self._cmd_snapshot,
+            'screenshot': self._cmd_screenshot,
+            'links': self._cmd_links,
+            'wait': self._cmd_wait,
+            'debug_elements': self._cmd_debug_elements,
+            'snapshot_mode': self._cmd_snapshot_mode,
+        }
+
         print(f"Debug session started: {self.session_id}")
         print(f"Output directory: {self.session_dir}")
 
@@ -126,9 +149,10 @@ class BrowserDebugDemo:
         """Main interactive command loop."""
         while True:
             try:
-                # Get user input
-                command = input(
-                    f"[{self.command_count}] browser_debug> ").strip()
+                # Get user input off-loop: a bare input() would block the
+                # event loop and freeze background page events while typing.
+                command = (await asyncio.get_running_loop().run_in_executor(
+                    None, input, f"[{self.command_count}] browser_debug> ")).strip()
 
                 if not command:
                     continue
@@ -181,30 +205,13 @@ class BrowserDebugDemo:
         # Route to appropriate handler
         if cmd == 'help':
             return self._show_help()
-        elif cmd == 'exit' or cmd == 'quit':
+        if cmd in ('exit', 'quit'):
             return "Goodbye!"
-        elif cmd == 'navigate':
-            return await self._cmd_navigate(args)
-        elif cmd == 'click':
-            return await self._cmd_click(args)
-        elif cmd == 'type':
-            return await self._cmd_type(args)
-        elif cmd == 'select':
-            return await self._cmd_select(args)
-        elif cmd == 'snapshot':
-            return await self._cmd_snapshot(args)
-        elif cmd == 'screenshot':
-            return await self._cmd_screenshot(args)
-        elif cmd == 'links':
-            return await self._cmd_links(args)
-        elif cmd == 'wait':
-            return await self._cmd_wait(args)
-        elif cmd == 'debug_elements':
-            return await self._cmd_debug_elements(args)
-        elif cmd == 'snapshot_mode':
-            return await self._cmd_snapshot_mode(args)
-        else:
+
+        handler = self._handlers.get(cmd)
+        if handler is None:
             return f"Unknown command: {cmd}. Type 'help' for available commands."
+        return await handler(args)
 
     def _show_help(self) -> str:
         """Show available commands."""
@@ -258,6 +265,7 @@ Tips:
             if self.toolkit is None:
                 return "Toolkit not initialized"
             result = await self.toolkit.visit_page(url)
+            self._analysis_cache = None
             return f"Navigated to: {url}\nFull result: {result}"
         except Exception as e:
             return f"Navigation failed: {e}"
@@ -276,10 +284,35 @@ Tips:
             await self._debug_element_info(ref)
             
             result = await self.toolkit.click(ref=ref)
+            self._analysis_cache = None
             return f"Clicked element {ref}\nFull result: {result}"
         except Exception as e:
             return f"Click failed: {e}"
 
+    async def _get_analysis_cached(self) -> Dict:
+        """Reuse the last unified analysis while the page is unchanged.
+
+        The DOM version is probed cheaply via the serialized document
+        length; any action that can mutate the page must invalidate the
+        cache by clearing ``self._analysis_cache``.
+        """
+        if self.toolkit is None:
+            return {}
+
+        page = await self.toolkit._require_page()
+        url = page.url
+        dom_version = await page.evaluate(
+            "document.documentElement.outerHTML.length")
+
+        if (self._analysis_cache
+                and self._analysis_cache[0] == url
+                and self._analysis_cache[1] == dom_version):
+            return self._analysis_cache[2]
+
+        analysis = await self.toolkit._get_unified_analysis()
+        self._analysis_cache = (url, dom_version, analysis)
+        return analysis
+
     async def _debug_element_info(self, ref: str) -> str:
         """Debug helper to check element information before click."""
         if self.toolkit is None:
@@ -290,7 +323,8 @@ Tips:
             page = await self.toolkit._require_page()
             
             # First, run unified analysis to ensure aria-ref attributes are set
-            analysis = await self.toolkit._get_unified_analysis()
+            # (cached while the page state is unchanged)
+            analysis = await self._get_analysis_cached()
             
             # Check if element exists in analysis
             elements = analysis.get("elements", {})
@@ -334,8 +368,8 @@ Tips:
             if self.toolkit is None:
                 return "Toolkit not initialized"
             
-            # Get analysis data
-            analysis = await self.toolkit._get_unified_analysis()
+            # Get analysis data (cached while the page state is unchanged)
+            analysis = await self._get_analysis_cached()
             elements = analysis.get("elements", {})
             
             if not elements:
@@ -378,6 +412,7 @@ Tips:
             if self.toolkit is None:
                 return "Toolkit not initialized"
             result = await self.toolkit.type(ref=ref, text=text)
+            self._analysis_cache = None
             return f"Typed '{text}' into element {ref}\nFull result: {result}"
         except Exception as e:
             return f"Type failed: {e}"
@@ -394,6 +429,7 @@ Tips:
             if self.toolkit is None:
                 return "Toolkit not initialized"
             result = await self.toolkit.select(ref=ref, value=value)
+            self._analysis_cache = None
             return f"Selected '{value}' in element {ref}\nFull result: {result}"
         except Exception as e:
             return f"Select failed: {e}"
@@ -430,6 +466,21 @@ Tips:
         try:
             if self.toolkit is None:
                 return "Toolkit not initialized"
+
+            # When the toolkit exposes a single-ref lookup, fan the refs out
+            # concurrently (bounded, so the browser isn't overloaded) instead
+            # of letting the bulk call resolve them one by one.
+            get_single = getattr(self.toolkit, "get_page_link", None)
+            if get_single is not None and len(args) > 1:
+                sem = asyncio.Semaphore(8)
+
+                async def _one(ref: str):
+                    async with sem:
+                        return await get_single(ref=ref)
+
+                results = await asyncio.gather(*(_one(r) for r in args))
+                return "\n".join(str(r).rstrip() for r in results)
+
             result = await self.toolkit.get_page_links(ref=args)
 
 
@@ -459,15 +510,17 @@ Tips:
             command (str): Original command
             result (Any): Result from command execution
         """
-        # Save command and result to log file
-        log_file = self.session_dir / "command_log.txt"
+        # Save command and result to the session-long log handle, as one
+        # pre-formatted write per command.
         timestamp = datetime.now().strftime("%H:%M:%S")
 
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(f"[{timestamp}] Command: {command}\n")
-            f.write(f"[{timestamp}] Result: {str(result)[:500]}...\n" if len(
-                str(result)) > 500 else f"[{timestamp}] Result: {result}\n")
-            f.write("-" * 50 + "\n")
+        result_str = str(result)
+        if len(result_str) > 500:
+            result_str = result_str[:500] + "..."
+        self._log_file.write(
+            f"[{timestamp}] Command: {command}\n"
+            f"[{timestamp}] Result: {result_str}\n"
+            f"{'-' * 50}\n")
 
         # Display result
         if isinstance(result, str):
@@ -477,6 +530,11 @@ Tips:
 
     async def _cleanup(self):
         """Cleanup resources."""
+        try:
+            self._log_file.close()
+        except Exception:
+            pass
+
         if self.toolkit:
             try:
                 await self.toolkit.close_browser()
@@ -1,23 +1,121 @@
+import asyncio
+import functools
+import hashlib
 import json
-import re
 import os
-from typing import Dict, List, Union, Any
+import sys
+import time
+from typing import Dict, List, Optional, Tuple, Union, Any
 
-from openai import OpenAI
 # from tenacity import retry, wait_random_exponential, stop_after_attempt
-from dotenv import load_dotenv
 
-load_dotenv()
+try:
+    import orjson
+except ImportError:  # optional speed-up only
+    orjson = None
 
-os.environ['OPENAI_API_KEY'] = os.getenv("OPENAI_API_KEY")
-# os.environ['OPENAI_API_KEY'] = os.getenv("api_hub")
-# os.environ['OPENAI_BASE_URL'] = "https://api.openai-hub.com/v1"
-client = OpenAI()
+# orjson decodes large model outputs several times faster than stdlib json;
+# fall back silently when it is not installed.
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def json_dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize via orjson when installed, stdlib json otherwise.
+
+    orjson returns bytes and always emits UTF-8, matching the
+    ensure_ascii=False convention used throughout; `indent` selects the
+    2-space pretty form used for user-facing prints.
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, option=option).decode()
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False)
+
+# Clients and their connection pools are built lazily: importing openai and
+# dotenv plus constructing the TLS context costs a few hundred ms, which
+# callers that only want message_template/format_list_string never need.
+_client = None
+_aclient_instance = None
+_ahttp = None
+
+
+def _ensure_env():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    os.environ['OPENAI_API_KEY'] = os.getenv("OPENAI_API_KEY")
+    # os.environ['OPENAI_API_KEY'] = os.getenv("api_hub")
+    # os.environ['OPENAI_BASE_URL'] = "https://api.openai-hub.com/v1"
+
+
+def _pool_limits():
+    # Raised limits so high-concurrency batches reuse keepalive sockets
+    # instead of paying a TLS+TCP handshake per call. Note: pools hold
+    # open sockets - safe across spawn, but do not fork a process that
+    # has already used them.
+    import httpx
+
+    return httpx.Limits(max_connections=512, max_keepalive_connections=256)
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        import httpx
+        from openai import OpenAI
+
+        _ensure_env()
+        _client = OpenAI(http_client=httpx.Client(limits=_pool_limits(),
+                                                  timeout=120))
+    return _client
+
+
+def _get_ahttp():
+    global _ahttp
+    if _ahttp is None:
+        import httpx
+
+        _ensure_env()
+        _ahttp = httpx.AsyncClient(limits=_pool_limits(), timeout=120)
+    return _ahttp
+
+
+def _get_aclient():
+    global _aclient_instance
+    if _aclient_instance is None:
+        from openai import AsyncOpenAI
+
+        _aclient_instance = AsyncOpenAI(http_client=_get_ahttp())
+    return _aclient_instance
+
+
+def warmup():
+    """Optionally pre-establish a connection so the first real chat call
+    does not pay the TLS handshake. Cheap: a single models.list round-trip."""
+    try:
+        _get_client().models.list()
+    except Exception:
+        pass
+
+
+@functools.lru_cache(maxsize=256)
+def _tmpl(role: str, content: str) -> Dict[str, str]:
+    # Cached plain dicts (not MappingProxyType: json encoders reject
+    # proxies). Callers treat messages as read-only, so sharing is safe.
+    return {'role': role, 'content': content}
 
 
 def message_template(role: str, content: Any) -> Dict[str, str]:
     """Create a message template dictionary.
 
+    Identical (role, content) pairs - typically a fixed system prompt
+    reused every call - share one cached dict instead of allocating a
+    fresh one per request. Treat the result as read-only.
+
+    Strings pass through untouched (the overwhelmingly common case),
+    bytes are decoded, and dict/list content is serialized as JSON
+    rather than the Python repr the old str() call produced.
+
     Args:
         role: Message role ('system', 'user', or 'assistant')
         content: Message content
@@ -25,39 +123,73 @@ def message_template(role: str, content: Any) -> Dict[str, str]:
     Returns:
         Dictionary containing role and content
     """
-    return {'role': role, 'content': str(content)}
+    if type(content) is str:
+        return _tmpl(role, content)
+    if isinstance(content, (bytes, bytearray)):
+        return _tmpl(role, content.decode('utf-8', 'replace'))
+    if isinstance(content, (dict, list)):
+        return _tmpl(role, json.dumps(content, ensure_ascii=False))
+    return _tmpl(role, str(content))
+
+
+# ANSI table built once at import; print_color used to rebuild this dict
+# (17 inserts) on every call, which adds up in verbose streaming loops.
+_COLOR_CODES = {
+    'default': '\033[39m',
+    'black': '\033[30m',
+    'red': '\033[31m',
+    'green': '\033[32m',
+    'yellow': '\033[33m',
+    'blue': '\033[34m',
+    'magenta': '\033[35m',
+    'cyan': '\033[36m',
+    'light_gray': '\033[37m',
+    'dark_gray': '\033[90m',
+    'light_red': '\033[91m',
+    'light_green': '\033[92m',
+    'light_yellow': '\033[93m',
+    'light_blue': '\033[94m',
+    'light_magenta': '\033[95m',
+    'light_cyan': '\033[96m',
+    'white': '\033[97m',
+}
+_RESET_CODE = '\033[0m'
+
+
+@functools.lru_cache(maxsize=32)
+def _color_code(color: str) -> str:
+    # Memoizes the .lower() + lookup so repeat calls with the same color
+    # (the norm in verbose streaming) hit the cache on the interned key.
+    return _COLOR_CODES.get(color.lower(), _COLOR_CODES['default'])
 
 
 def print_color(text, color='default'):
-    color_codes = {
-        'default': '\033[39m',
-        'black': '\033[30m',
-        'red': '\033[31m',
-        'green': '\033[32m',
-        'yellow': '\033[33m',
-        'blue': '\033[34m',
-        'magenta': '\033[35m',
-        'cyan': '\033[36m',
-        'light_gray': '\033[37m',
-        'dark_gray': '\033[90m',
-        'light_red': '\033[91m',
-        'light_green': '\033[92m',
-        'light_yellow': '\033[93m',
-        'light_blue': '\033[94m',
-        'light_magenta': '\033[95m',
-        'light_cyan': '\033[96m',
-        'white': '\033[97m',
-    }
+    out = sys.stdout
+    out.write(_color_code(color))
+    out.write(text if isinstance(text, str) else str(text))
+    out.write(_RESET_CODE)
+    out.write('\n')
+
+
+# Exact-match response cache. Only deterministic requests (temperature=0,
+# non-streaming) are cached, so a hit is a safe replay of the same answer
+# and saves the full network round-trip.
+_resp_cache: Dict[bytes, Any] = {}
+_RESP_CACHE_MAX = 1024
+
+
+def _cache_key(messages, model, temperature, mode) -> bytes:
+    payload = json.dumps((model, temperature, mode, messages),
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
 
-    reset_code = '\033[0m'
-    color_code = color_codes.get(color.lower(), color_codes['default'])
-    print(f"{color_code}{text}{reset_code}")
 
 def chat_single(messages: List[Dict[str, str]],
                 mode: str = "",
                 model: str = 'gpt-4.1',
                 temperature: float = 0.3,
-                verbose: bool = False):
+                verbose: bool = False,
+                max_tokens: Optional[int] = None):
     """Send a single chat request to OpenAI API.
 
     Args:
@@ -66,43 +198,126 @@ def chat_single(messages: List[Dict[str, str]],
         model: Model to use
         temperature: Temperature parameter controlling response randomness
         verbose: Whether to print detailed information
+        max_tokens: Optional completion cap. Left unset by default: a
+            hard-coded cap makes the scheduler reserve worst-case
+            capacity and hurts time-to-first-token
 
     Returns:
         Different types of responses based on mode
     """
+    cacheable = temperature == 0 and mode in ("", "json", "json_few_shot")
+    if cacheable:
+        key = _cache_key(messages, model, temperature, mode)
+        if key in _resp_cache:
+            return _resp_cache[key]
+
+    extra = {"max_tokens": max_tokens} if max_tokens else {}
     if mode == "stream":
-        response = client.chat.completions.create(
+        response = _get_client().chat.completions.create(
             model=model,
             messages=messages,
             temperature=temperature,
             stream=True,
-            max_tokens=2560
+            **extra
         )
         return response
     elif mode == "json":
-        response = client.chat.completions.create(
+        response = _get_client().chat.completions.create(
             model=model,
             response_format={"type": "json_object"},
             temperature=temperature,
-            messages=messages
+            messages=messages,
+            **extra
         )
         if verbose:
             print_color(response.choices[0].message.content,'blue')
             print(response.choices[0].message.content)
-        return json.loads(response.choices[0].message.content)
+        result = _loads(response.choices[0].message.content)
+    elif mode == 'json_few_shot':
+        response = _get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0,
+            **extra
+        )
+        raw = response.choices[0].message.content
+        if verbose:
+            print(raw)
+        result = extract_json_and_similar_words(raw)
+    else:
+        response = _get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+        if verbose:
+            print(response.choices[0].message.content)
+        result = response.choices[0].message.content
+
+    if cacheable:
+        if len(_resp_cache) >= _RESP_CACHE_MAX:
+            _resp_cache.pop(next(iter(_resp_cache)))
+        _resp_cache[key] = result
+    return result
+
+
+async def achat_single(messages: List[Dict[str, str]],
+                       mode: str = "",
+                       model: str = 'gpt-4.1',
+                       temperature: float = 0.3,
+                       verbose: bool = False,
+                       max_tokens: Optional[int] = None):
+    """Async counterpart of `chat_single` built on AsyncOpenAI.
+
+    Awaiting the HTTP round-trip instead of blocking on it lets callers
+    overlap many in-flight requests on one event loop (see `chat_many`).
+
+    Args:
+        messages: List of messages
+        mode: Response mode ('stream', 'json', 'json_few_shot', or empty string for normal mode)
+        model: Model to use
+        temperature: Temperature parameter controlling response randomness
+        verbose: Whether to print detailed information
+        max_tokens: Optional completion cap (unset by default, see
+            `chat_single`)
+
+    Returns:
+        Different types of responses based on mode
+    """
+    extra = {"max_tokens": max_tokens} if max_tokens else {}
+    if mode == "stream":
+        response = await _get_aclient().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            **extra
+        )
+        return response
+    elif mode == "json":
+        response = await _get_aclient().chat.completions.create(
+            model=model,
+            response_format={"type": "json_object"},
+            temperature=temperature,
+            messages=messages,
+            **extra
+        )
+        if verbose:
+            print_color(response.choices[0].message.content, 'blue')
+        return _loads(response.choices[0].message.content)
     elif mode == 'json_few_shot':
-        response = client.chat.completions.create(
+        response = await _get_aclient().chat.completions.create(
             model=model,
             messages=messages,
             temperature=0,
-            max_tokens=2560
+            **extra
         )
         result = response.choices[0].message.content
         if verbose:
             print(result)
         return extract_json_and_similar_words(result)
     else:
-        response = client.chat.completions.create(
+        response = await _get_aclient().chat.completions.create(
             model=model,
             messages=messages,
             temperature=temperature,
@@ -112,34 +327,428 @@ def chat_single(messages: List[Dict[str, str]],
         return response.choices[0].message.content
 
 
+_API_BASE = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+
+async def chat_single_raw(messages: List[Dict[str, str]],
+                          mode: str = "",
+                          model: str = 'gpt-4.1',
+                          temperature: float = 0.3):
+    """Hot-path completion that POSTs to /chat/completions directly.
+
+    Skips the SDK's request/response model layer and reuses the shared
+    async connection pool, which keeps per-call overhead flat at high
+    concurrency. Returns the same shapes as `achat_single` so callers can
+    swap it in transparently.
+
+    Args:
+        messages: List of messages
+        mode: '' for plain text, 'json' for a parsed JSON object,
+            'stream' for an async generator of content fragments
+        model: Model to use
+        temperature: Temperature parameter controlling response randomness
+    """
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+    }
+    _ensure_env()
+    headers = {"Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}"}
+    url = f"{_API_BASE}/chat/completions"
+
+    if mode == "stream":
+        payload["stream"] = True
+
+        async def _gen():
+            async with _get_ahttp().stream("POST", url, json=payload,
+                                     headers=headers) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[6:]
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0]["delta"]
+                    content = delta.get("content")
+                    if content:
+                        yield content
+
+        return _gen()
+
+    if mode == "json":
+        payload["response_format"] = {"type": "json_object"}
+
+    r = await _get_ahttp().post(url, json=payload, headers=headers)
+    r.raise_for_status()
+    content = r.json()["choices"][0]["message"]["content"]
+    return _loads(content) if mode == "json" else content
+
+
+async def chat_many(messages_list: List[List[Dict[str, str]]],
+                    mode: str = "",
+                    model: str = 'gpt-4.1',
+                    temperature: float = 0.3,
+                    concurrency: int = 8) -> List[Any]:
+    """Run a batch of chat requests concurrently.
+
+    Network waits overlap on the event loop, so wall-clock time for a
+    batch approaches the slowest single request instead of the sum. The
+    semaphore keeps the number of in-flight requests under the API rate
+    limit.
+
+    Args:
+        messages_list: One message list per request
+        mode: Response mode forwarded to `achat_single`
+        model: Model to use
+        temperature: Temperature parameter controlling response randomness
+        concurrency: Maximum number of simultaneous requests
+
+    Returns:
+        Responses in the same order as `messages_list`
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(messages):
+        async with sem:
+            return await achat_single(messages, mode=mode, model=model,
+                                      temperature=temperature)
+
+    return await asyncio.gather(*(one(m) for m in messages_list))
+
+
+def chat_batch(jobs: List[Tuple[str, List[Dict[str, str]]]],
+               model: str = 'gpt-4.1',
+               poll_interval: float = 5.0,
+               completion_window: str = '24h') -> Dict[str, Any]:
+    """Run a large fan-out of JSON-mode chats through the OpenAI batch API.
+
+    Structured, non-interactive prompts (the json/json_few_shot workload)
+    do not need a live connection per request; the batch endpoint runs
+    them at roughly half the cost and without tying up the connection
+    pool. Worth it from ~50 jobs up; below that `chat_many` is faster.
+
+    Args:
+        jobs: List of (custom_id, messages) pairs
+        model: Model to use
+        poll_interval: Initial seconds between status polls (backs off
+            exponentially, capped at 60s)
+        completion_window: Batch completion window accepted by the API
+
+    Returns:
+        Mapping of custom_id to the parsed JSON response object
+    """
+    import io
+
+    client = _get_client()
+
+    lines = [json.dumps({
+        "custom_id": jid,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "messages": msgs,
+            "response_format": {"type": "json_object"},
+        },
+    }, ensure_ascii=False) for jid, msgs in jobs]
+    bio = io.BytesIO("\n".join(lines).encode())
+
+    batch_file = client.files.create(file=bio, purpose='batch')
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint='/v1/chat/completions',
+        completion_window=completion_window,
+    )
+
+    delay = poll_interval
+    while True:
+        batch = client.batches.retrieve(batch.id)
+        if batch.status == 'completed':
+            break
+        if batch.status in ('failed', 'expired', 'cancelled'):
+            raise RuntimeError(f"Batch {batch.id} ended with status "
+                               f"'{batch.status}'")
+        time.sleep(delay)
+        delay = min(delay * 1.5, 60)
+
+    output = client.files.content(batch.output_file_id).text
+    results: Dict[str, Any] = {}
+    for line in output.splitlines():
+        if not line:
+            continue
+        record = _loads(line)
+        content = record["response"]["body"]["choices"][0]["message"]["content"]
+        results[record["custom_id"]] = _loads(content)
+    return results
+
+
+def chat_stream(messages: List[Dict[str, str]],
+                model: str = 'gpt-4.1',
+                temperature: float = 0.3):
+    """Stream a JSON-mode chat completion, yielding content chunks.
+
+    Closing the generator early also closes the underlying HTTP stream,
+    so callers can stop as soon as they have parsed what they need.
+
+    Args:
+        messages: List of messages
+        model: Model to use
+        temperature: Temperature parameter controlling response randomness
+
+    Yields:
+        Content string fragments in arrival order
+    """
+    response = _get_client().chat.completions.create(
+        model=model,
+        response_format={"type": "json_object"},
+        temperature=temperature,
+        messages=messages,
+        stream=True
+    )
+    for chunk in response:
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+def stream_json_response(messages: List[Dict[str, str]],
+                         model: str = 'gpt-4.1',
+                         temperature: float = 0.3) -> Optional[Dict]:
+    """Stream a JSON-mode completion and return the object once it closes.
+
+    A string-aware brace counter tracks nesting depth; the moment the
+    top-level object balances, the stream is closed - trailing tokens the
+    model might still emit are never waited for. Callers acting on a
+    single field (e.g. an agent's next action) therefore get it as early
+    as the model can produce it.
+
+    Args:
+        messages: List of messages
+        model: Model to use
+        temperature: Temperature parameter controlling response randomness
+
+    Returns:
+        The parsed JSON object, or None if no object was produced
+    """
+    stream = chat_stream(messages, model=model, temperature=temperature)
+    buf = []
+    depth = 0
+    started = False
+    in_str = False
+    esc = False
+    done = False
+    try:
+        for delta in stream:
+            buf.append(delta)
+            for c in delta:
+                if in_str:
+                    if esc:
+                        esc = False
+                    elif c == '\\':
+                        esc = True
+                    elif c == '"':
+                        in_str = False
+                elif c == '"':
+                    in_str = True
+                elif c == '{':
+                    depth += 1
+                    started = True
+                elif c == '}':
+                    depth -= 1
+                    if started and depth == 0:
+                        done = True
+                        break
+            if done:
+                break
+    finally:
+        stream.close()
+
+    text = "".join(buf)
+    end = text.rfind('}')
+    if end == -1:
+        return None
+    return _loads(text[text.find('{'):end + 1])
+
+
+def consume_stream(response) -> str:
+    """Print a streamed completion while buffering it into one string.
+
+    Accumulates chunks in a list and joins once at the end — linear total
+    allocation instead of the O(n^2) worst case of repeated `+=` on str.
+
+    Args:
+        response: Stream object returned by `chat_single(mode="stream")`
+
+    Returns:
+        The full concatenated response text
+    """
+    parts = []
+    buf = []
+    buf_len = 0
+    last_flush = time.monotonic()
+    for chunk in response:
+        content_chunk = chunk.choices[0].delta.content
+        if content_chunk:
+            parts.append(content_chunk)
+            buf.append(content_chunk)
+            buf_len += len(content_chunk)
+            now = time.monotonic()
+            # Flush every ~64 chars or 20 ms: keeps the streaming feel
+            # while cutting write+flush syscalls by an order of magnitude.
+            if buf_len >= 64 or now - last_flush > 0.02:
+                sys.stdout.write("".join(buf))
+                sys.stdout.flush()
+                buf.clear()
+                buf_len = 0
+                last_flush = now
+    if buf:
+        sys.stdout.write("".join(buf))
+        sys.stdout.flush()
+    return "".join(parts)
+
+
+def extract_json_value(text: str, key: str) -> Any:
+    """Extract the value of `key` from a possibly *partial* JSON document.
+
+    Scans for the first complete object/array/scalar assigned to the key
+    using brace counting, so it works on a truncated stream buffer long
+    before the document's closing brace has arrived.
+
+    Args:
+        text: JSON text, potentially incomplete
+        key: Top-level key to look for
+
+    Returns:
+        The parsed value, or None if it is not complete yet
+    """
+    idx = text.find(f'"{key}"')
+    if idx == -1:
+        return None
+    colon = text.find(':', idx + len(key) + 2)
+    if colon == -1:
+        return None
+
+    i = colon + 1
+    while i < len(text) and text[i] in ' \t\r\n':
+        i += 1
+    if i >= len(text):
+        return None
+
+    opener = text[i]
+    if opener not in '{[':
+        # Scalar value – complete once a comma or closing brace follows.
+        end = i
+        in_str = text[end] == '"'
+        esc = False
+        end += 1 if in_str else 0
+        while end < len(text):
+            c = text[end]
+            if in_str:
+                if esc:
+                    esc = False
+                elif c == '\\':
+                    esc = True
+                elif c == '"':
+                    end += 1
+                    break
+            elif c in ',}\n':
+                break
+            end += 1
+        else:
+            return None
+        try:
+            return json.loads(text[i:end])
+        except json.JSONDecodeError:
+            return None
+
+    closer = '}' if opener == '{' else ']'
+    depth = 0
+    in_str = False
+    esc = False
+    for end in range(i, len(text)):
+        c = text[end]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == '\\':
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == opener:
+            depth += 1
+        elif c == closer:
+            depth -= 1
+            if depth == 0:
+                try:
+                    return json.loads(text[i:end + 1])
+                except json.JSONDecodeError:
+                    return None
+    return None
+
+
+def _split_list_elements(list_content: str) -> List[str]:
+    """Split a JSON-ish list body on commas, honouring quoted elements."""
+    elements = []
+    buf = []
+    quote = ''
+    for c in list_content:
+        if quote:
+            buf.append(c)
+            if c == quote:
+                quote = ''
+        elif c in '\'"':
+            quote = c
+            buf.append(c)
+        elif c == ',':
+            elem = ''.join(buf).strip()
+            if elem:
+                elements.append(elem)
+            buf = []
+        else:
+            buf.append(c)
+    elem = ''.join(buf).strip()
+    if elem:
+        elements.append(elem)
+    return elements
+
+
 def format_list_string(input_str: str) -> str:
     """Format a string containing a list into valid JSON.
 
+    Uses a linear bracket scan rather than a backtracking regex, so cost
+    stays O(n) even on long model outputs.
+
     Args:
         input_str: String containing a list
 
     Returns:
         Formatted JSON string
     """
-    match = re.search(r'\{\s*"[^"]+"\s*:\s*\[(.*?)\]\s*\}', input_str)
-    if not match:
+    start = input_str.find('[')
+    end = input_str.find(']', start)
+    if start == -1 or end == -1:
         return "Invalid input format"
 
-    list_content = match.group(1)
-    elements = [e.strip() for e in list_content.split(',')]
-
     formatted_elements = []
-    for elem in elements:
-        if not re.match(r'^([\'"])(.*)\1$', elem):
-            elem = f'"{elem}"'
-        formatted_elements.append(elem)
+    for elem in _split_list_elements(input_str[start + 1:end]):
+        if len(elem) >= 2 and elem[0] in ('"', "'") and elem[-1] == elem[0]:
+            formatted_elements.append(elem)
+        else:
+            formatted_elements.append(f'"{elem}"')
 
-    return f'{{ "similar_words":[{", ".join(formatted_elements)}]}}'
+    return '{ "similar_words":[' + ', '.join(formatted_elements) + ']}'
 
 
 def extract_json_and_similar_words(text: str) -> Dict[str, Any]:
     """Extract JSON data from text.
 
+    Locates the ```json fence with two `str.find` calls instead of a
+    DOTALL regex over the whole response.
+
     Args:
         text: Text containing JSON data
 
@@ -147,16 +756,18 @@ def extract_json_and_similar_words(text: str) -> Dict[str, Any]:
         Extracted JSON data dictionary
     """
     try:
-        json_match = re.search(r'```json\s*({.*?})\s*```', text, re.DOTALL)
-
-        if not json_match:
+        fence = text.find('```json')
+        if fence == -1:
+            raise ValueError("No JSON data found in the text.")
+        close = text.find('```', fence + 7)
+        if close == -1:
             raise ValueError("No JSON data found in the text.")
 
-        json_str = json_match.group(1)
+        json_str = text[fence + 7:close].strip()
         if 'similar_words' in text:
-            data = json.loads(format_list_string(json_str))
+            data = _loads(format_list_string(json_str))
         else:
-            data = json.loads(json_str)
+            data = _loads(json_str)
 
         return data
     except Exception as e:
@@ -164,7 +775,7 @@ def extract_json_and_similar_words(text: str) -> Dict[str, Any]:
         return {"error": str(e)}
 
 
-def run_examples():
+async def run_examples():
     """Run examples for all modes, demonstrating different API call methods."""
 
     # Base message template for all examples
@@ -173,59 +784,78 @@ def run_examples():
                          'hi'),
     ]
 
-    print("\n===== 1. Standard Mode Example =====")
     standard_messages = base_messages.copy()
     standard_messages.append(
         message_template('user', 'Who are you?'))
 
-    standard_response = chat_single(standard_messages)
-    print(f"Response:\n{standard_response}\n")
+    json_messages = base_messages.copy()
+    json_messages.append(message_template('user',
+                                          'Provide names and brief descriptions of three main Python data structures in JSON format.'))
+
+    few_shot_messages = base_messages.copy()
+    few_shot_messages.append(message_template('user',
+                                              '''Please provide words similar to "programming".
+
+                                              Please reply in the following JSON format:
+                                              ```json
+                                              {
+                                                "similar_words": ["coding", "development", ...]
+                                              }
+                                              ```
+                                              '''))
+
+    # Fire the three non-streaming examples concurrently – their network
+    # waits overlap so the batch finishes in roughly one round-trip.
+    standard_task = asyncio.create_task(achat_single(standard_messages))
+    json_task = asyncio.create_task(achat_single(json_messages, mode="json"))
+    few_shot_task = asyncio.create_task(
+        achat_single(few_shot_messages, mode="json_few_shot", verbose=True))
+
+    print("\n===== 1. Standard Mode Example =====")
+    print(f"Response:\n{await standard_task}\n")
 
     print("\n===== 2. Stream Response Mode Example =====")
     stream_messages = base_messages.copy()
     stream_messages.append(
         message_template('user', 'Explain the concept of asynchronous programming in Python.'))
 
-    stream_response = chat_single(stream_messages, mode="stream")
+    stream_response = await achat_single(stream_messages, mode="stream")
 
-    collected_response = ""
+    parts = []
     print("Stream response:")
-    for chunk in stream_response:
-        if chunk.choices[0].delta.content is not None:
-            content_chunk = chunk.choices[0].delta.content
-            collected_response += content_chunk
-            print(content_chunk, end="", flush=True)
+    buf = []
+    buf_len = 0
+    last_flush = time.monotonic()
+    async for chunk in stream_response:
+        content_chunk = chunk.choices[0].delta.content
+        if content_chunk:
+            parts.append(content_chunk)
+            buf.append(content_chunk)
+            buf_len += len(content_chunk)
+            now = time.monotonic()
+            if buf_len >= 64 or now - last_flush > 0.02:
+                sys.stdout.write("".join(buf))
+                sys.stdout.flush()
+                buf.clear()
+                buf_len = 0
+                last_flush = now
+    if buf:
+        sys.stdout.write("".join(buf))
+        sys.stdout.flush()
+    collected_response = "".join(parts)
 
     print("\n\nComplete collected response:")
     print(collected_response)
 
     print("\n===== 3. JSON Response Mode Example =====")
-    json_messages = base_messages.copy()
-    json_messages.append(message_template('user',
-                                          'Provide names and brief descriptions of three main Python data structures in JSON format.'))
-
-    json_response = chat_single(json_messages, mode="json")
+    json_response = await json_task
     print(f"JSON response:\n{json_response}\n")
-    print(f"Parsed JSON:\n{json.loads(json_response)}\n")
 
     print(
         "\n===== 4. JSON Few-Shot Example =====")  # Can retain reasoning part to reduce performance degradation caused by structured output text
-    few_shot_messages = base_messages.copy()
-    few_shot_messages.append(message_template('user',
-                                              '''Please provide words similar to "programming".
-
-                                              Please reply in the following JSON format:
-                                              ```json
-                                              {
-                                                "similar_words": ["coding", "development", ...]
-                                              }
-                                              ```
-                                              '''))
-
-    few_shot_response = chat_single(few_shot_messages, mode="json_few_shot",
-                                    verbose=True)
+    few_shot_response = await few_shot_task
     print(f"Processed response:\n{few_shot_response}\n")
 
 
 if __name__ == "__main__":
-    run_examples()
\ No newline at end of file
+    asyncio.run(run_examples())
\ No newline at end of file
@@ -1,6 +1,23 @@
 from playwright_llm_agent import PlaywrightLLMAgent
 from typing import Dict, Any, Optional
+import atexit
 import json
+import os
+
+# Line editing + capped, persistent history for the REPL. Without readline
+# arrow keys are unusable and pasted sessions grow history unbounded.
+try:
+    import readline
+
+    readline.set_history_length(1000)
+    _histfile = os.path.expanduser('~/.playwright_demo_history')
+    try:
+        readline.read_history_file(_histfile)
+    except FileNotFoundError:
+        pass
+    atexit.register(readline.write_history_file, _histfile)
+except ImportError:  # e.g. Windows without pyreadline
+    pass
 
 # Use PlaywrightLLMAgent directly instead of maintaining separate code
 class ManualPlaywrightDemo(PlaywrightLLMAgent):
@@ -23,139 +40,141 @@ class ManualPlaywrightDemo(PlaywrightLLMAgent):
         return super().get_current_snapshot(method=method,
                                             include_all=include_all)
 
-def parse_command(command_str: str) -> Optional[Dict[str, Any]]:
-    """Parse space-separated command string into action dictionary"""
-    parts = command_str.strip().split()
-    if not parts:
+def _parse_click(parts) -> Optional[Dict[str, Any]]:
+    method = parts[1].lower()
+    value = ' '.join(parts[2:])  # Join remaining parts for text that may contain spaces
+
+    if method == 'selector':
+        return {'type': 'click', 'selector': value}
+    elif method == 'text':
+        return {'type': 'click', 'text': value}
+    elif method == 'ref':
+        return {'type': 'click', 'ref': value}
+    else:
+        print(f"错误: 未知的点击方式 '{method}'. 支持: selector, text, ref")
         return None
-    
-    action_type = parts[0].lower()
-    
-    if action_type == 'click':
-        if len(parts) < 3:
-            print("错误: click命令需要至少2个参数: click <方式> <值>")
-            return None
-        
-        method = parts[1].lower()
-        value = ' '.join(parts[2:])  # Join remaining parts for text that may contain spaces
-        
-        if method == 'selector':
-            return {'type': 'click', 'selector': value}
-        elif method == 'text':
-            return {'type': 'click', 'text': value}
-        elif method == 'ref':
-            return {'type': 'click', 'ref': value}
-        else:
-            print(f"错误: 未知的点击方式 '{method}'. 支持: selector, text, ref")
-            return None
-    
-    elif action_type == 'type':
-        if len(parts) < 4:
-            print("错误: type命令需要至少3个参数: type <方式> <选择器> <文本>")
-            return None
-        
-        method = parts[1].lower()
-        target = parts[2]
-        text = ' '.join(parts[3:])  # Join remaining parts for text
-        
-        if method == 'selector':
-            return {'type': 'type', 'selector': target, 'text': text}
-        elif method == 'ref':
-            return {'type': 'type', 'ref': target, 'text': text}
-        else:
-            print(f"错误: 未知的输入方式 '{method}'. 支持: selector, ref")
-            return None
-    
-    elif action_type == 'select':
-        if len(parts) < 4:
-            print("错误: select命令需要至少3个参数: select <方式> <选择器> <值>")
-            return None
-        
-        method = parts[1].lower()
-        target = parts[2]
-        value = ' '.join(parts[3:])  # Join remaining parts for value
-        
-        if method == 'selector':
-            return {'type': 'select', 'selector': target, 'value': value}
-        elif method == 'ref':
-            return {'type': 'select', 'ref': target, 'value': value}
-        else:
-            print(f"错误: 未知的选择方式 '{method}'. 支持: selector, ref")
-            return None
-    
-    elif action_type == 'wait':
-        if len(parts) < 3:
-            print("错误: wait命令需要至少2个参数: wait <类型> <值>")
-            return None
-        
-        wait_type = parts[1].lower()
-        value = parts[2]
-        
-        if wait_type == 'timeout':
-            try:
-                timeout_ms = int(value)
-                return {'type': 'wait', 'timeout': timeout_ms}
-            except ValueError:
-                print(f"错误: timeout值必须是数字: {value}")
-                return None
-        elif wait_type == 'selector':
-            return {'type': 'wait', 'selector': value}
-        else:
-            print(f"错误: 未知的等待类型 '{wait_type}'. 支持: timeout, selector")
-            return None
-    
-    elif action_type == 'scroll':
-        if len(parts) < 3:
-            print("错误: scroll命令需要至少2个参数: scroll <方向> <距离>")
-            return None
-        
-        direction = parts[1].lower()
+
+def _parse_type(parts) -> Optional[Dict[str, Any]]:
+    method = parts[1].lower()
+    target = parts[2]
+    text = ' '.join(parts[3:])  # Join remaining parts for text
+
+    if method == 'selector':
+        return {'type': 'type', 'selector': target, 'text': text}
+    elif method == 'ref':
+        return {'type': 'type', 'ref': target, 'text': text}
+    else:
+        print(f"错误: 未知的输入方式 '{method}'. 支持: selector, ref")
+        return None
+
+def _parse_select(parts) -> Optional[Dict[str, Any]]:
+    method = parts[1].lower()
+    target = parts[2]
+    value = ' '.join(parts[3:])  # Join remaining parts for value
+
+    if method == 'selector':
+        return {'type': 'select', 'selector': target, 'value': value}
+    elif method == 'ref':
+        return {'type': 'select', 'ref': target, 'value': value}
+    else:
+        print(f"错误: 未知的选择方式 '{method}'. 支持: selector, ref")
+        return None
+
+def _parse_wait(parts) -> Optional[Dict[str, Any]]:
+    wait_type = parts[1].lower()
+    value = parts[2]
+
+    if wait_type == 'timeout':
         try:
-            amount = int(parts[2])
+            timeout_ms = int(value)
+            return {'type': 'wait', 'timeout': timeout_ms}
         except ValueError:
-            print(f"错误: 滚动距离必须是数字: {parts[2]}")
-            return None
-        
-        if direction in ['down', 'up']:
-            return {'type': 'scroll', 'direction': direction, 'amount': amount}
-        else:
-            print(f"错误: 未知的滚动方向 '{direction}'. 支持: down, up")
+            print(f"错误: timeout值必须是数字: {value}")
             return None
-    
+    elif wait_type == 'selector':
+        return {'type': 'wait', 'selector': value}
     else:
+        print(f"错误: 未知的等待类型 '{wait_type}'. 支持: timeout, selector")
+        return None
+
+def _parse_scroll(parts) -> Optional[Dict[str, Any]]:
+    direction = parts[1].lower()
+    try:
+        amount = int(parts[2])
+    except ValueError:
+        print(f"错误: 滚动距离必须是数字: {parts[2]}")
+        return None
+
+    if direction in ['down', 'up']:
+        return {'type': 'scroll', 'direction': direction, 'amount': amount}
+    else:
+        print(f"错误: 未知的滚动方向 '{direction}'. 支持: down, up")
+        return None
+
+# Dispatch table: verb -> (minimum token count, parser, usage hint).
+# One dict lookup replaces the old elif chain's repeated string compares.
+_COMMAND_SPECS = {
+    'click': (3, _parse_click, "click命令需要至少2个参数: click <方式> <值>"),
+    'type': (4, _parse_type, "type命令需要至少3个参数: type <方式> <选择器> <文本>"),
+    'select': (4, _parse_select, "select命令需要至少3个参数: select <方式> <选择器> <值>"),
+    'wait': (3, _parse_wait, "wait命令需要至少2个参数: wait <类型> <值>"),
+    'scroll': (3, _parse_scroll, "scroll命令需要至少2个参数: scroll <方向> <距离>"),
+}
+
+def parse_command(command_str: str) -> Optional[Dict[str, Any]]:
+    """Parse space-separated command string into action dictionary"""
+    parts = command_str.split()
+    if not parts:
+        return None
+
+    action_type = parts[0].lower()
+    spec = _COMMAND_SPECS.get(action_type)
+    if spec is None:
         print(f"错误: 未知的操作类型 '{action_type}'")
         return None
 
+    min_parts, parser, usage = spec
+    if len(parts) < min_parts:
+        print(f"错误: {usage}")
+        return None
+
+    return parser(parts)
+
+# Help text assembled once: a single write instead of ~20 print calls.
+_HELP = "\n".join([
+    "\n=== 可用操作 ===",
+    "1. navigate <url> - 导航到URL",
+    "   例如: navigate https://www.google.com",
+    "2. click - 点击元素",
+    "   格式: click <方式> <值>",
+    "   例如: click selector button",
+    "   例如: click text Search",
+    "   例如: click ref e123",
+    "3. type - 在输入框中输入文字",
+    "   格式: type <方式> <选择器> <文本>",
+    "   例如: type selector input hello world",
+    "   例如: type ref e64 Python programming",
+    "4. select - 在下拉框中选择选项",
+    "   格式: select <方式> <选择器> <值>",
+    "   例如: select selector select option1",
+    "   例如: select ref e68 English",
+    "5. wait - 等待",
+    "   格式: wait <类型> <值>",
+    "   例如: wait timeout 2000",
+    "   例如: wait selector button",
+    "6. scroll - 滚动页面",
+    "   格式: scroll <方向> <距离>",
+    "   例如: scroll down 300",
+    "   例如: scroll up 200",
+    "7. snapshot - 获取当前页面snapshot",
+    "8. help - 显示帮助",
+    "9. quit - 退出程序",
+    "================\n",
+])
+
 def print_help():
     """Print available commands"""
-    print("\n=== 可用操作 ===")
-    print("1. navigate <url> - 导航到URL")
-    print("   例如: navigate https://www.google.com")
-    print("2. click - 点击元素")
-    print("   格式: click <方式> <值>")
-    print("   例如: click selector button")
-    print("   例如: click text Search")
-    print("   例如: click ref e123")
-    print("3. type - 在输入框中输入文字")
-    print("   格式: type <方式> <选择器> <文本>")
-    print("   例如: type selector input hello world")
-    print("   例如: type ref e64 Python programming")
-    print("4. select - 在下拉框中选择选项")
-    print("   格式: select <方式> <选择器> <值>")
-    print("   例如: select selector select option1")
-    print("   例如: select ref e68 English")
-    print("5. wait - 等待")
-    print("   格式: wait <类型> <值>")
-    print("   例如: wait timeout 2000")
-    print("   例如: wait selector button")
-    print("6. scroll - 滚动页面")
-    print("   格式: scroll <方向> <距离>")
-    print("   例如: scroll down 300")
-    print("   例如: scroll up 200")
-    print("7. snapshot - 获取当前页面snapshot")
-    print("8. help - 显示帮助")
-    print("9. quit - 退出程序")
-    print("================\n")
+    print(_HELP)
 
 def main():
     print("=== 手动Playwright操作Demo ===")
@@ -164,7 +183,10 @@ def main():
     print("现在使用playwright_llm_agent的统一逻辑，所有点击都是强制的！")
     
     demo = ManualPlaywrightDemo()
-    
+    # Off by default: a full DOM walk after every manual action can cost
+    # more than the action itself. Toggle with `snap on` / `snap off`.
+    auto_snapshot = False
+
     try:
         print_help()
         
@@ -180,6 +202,10 @@ def main():
             elif user_input.lower() == 'help':
                 print_help()
                 continue
+            elif user_input.lower() in ('snap on', 'snap off'):
+                auto_snapshot = user_input.lower().endswith('on')
+                print(f"自动snapshot已{'开启' if auto_snapshot else '关闭'}")
+                continue
             elif user_input.lower().startswith('snapshot'):
                 # 格式: snapshot [method] [all]
                 parts = user_input.split()
@@ -218,12 +244,12 @@ def main():
                 try:
                     result = demo.execute_manual_action(action)
                     print(f"操作结果: {result}")
-                    
-                    # Show updated snapshot
-                    print("\n更新后的Snapshot:")
-                    snapshot = demo.get_current_snapshot()
-                    print(snapshot)
-                    
+
+                    if auto_snapshot:
+                        print("\n更新后的Snapshot:")
+                        snapshot = demo.get_current_snapshot()
+                        print(snapshot)
+
                 except Exception as e:
                     print(f"执行操作时出错: {e}")
             else:
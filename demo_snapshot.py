@@ -2,22 +2,254 @@ from playwright.sync_api import sync_playwright
 import json
 from typing import Dict, List, Optional, Any, Tuple, Union
 import yaml
-from chat_py import chat_single, message_template
+from chat_py import chat_single, json_dumps, message_template, \
+    stream_json_response
+from snapshot import ref_selector
+import difflib
 import time
 
 
+# Counts subtree mutations so the snapshot cache key changes whenever the
+# page actually changes; installed once per document.
+_MUTATION_COUNTER_JS = """
+(() => {
+  if (window.__mutationCounterObs) return;
+  window.__mutationCounter = 0;
+  const obs = new MutationObserver(() => { window.__mutationCounter++; });
+  const start = () => obs.observe(document.documentElement,
+      {childList: true, subtree: true, attributes: true, characterData: true});
+  if (document.documentElement) start();
+  else document.addEventListener('DOMContentLoaded', start);
+  window.__mutationCounterObs = obs;
+})();
+"""
+
+# Quiescence predicate for wait_for_function: installs a MutationObserver
+# on first use and reports true once no mutation has landed for `quiet` ms.
+_DOM_QUIESCENT_JS = """
+(quiet) => {
+  if (!window.__qObs) {
+    window.__qLast = Date.now();
+    window.__qObs = new MutationObserver(() => window.__qLast = Date.now());
+    window.__qObs.observe(document, {childList: true, subtree: true, attributes: true});
+  }
+  return Date.now() - window.__qLast > quiet;
+}
+"""
+
+
+def _wait_for_dom_quiescent(page, quiet_ms=300, timeout=5000):
+    """Block until the DOM has been mutation-free for `quiet_ms`.
+
+    Replaces the fixed sleep pads: a settled page passes in ~quiet_ms,
+    a busy one is bounded by `timeout` instead of an arbitrary guess.
+    """
+    try:
+        page.wait_for_function(_DOM_QUIESCENT_JS, arg=quiet_ms,
+                               timeout=timeout)
+    except Exception:
+        pass  # ceiling reached; proceed with the page as-is
+
+
+# One evaluate producing everything the cache key needs - cheap reads only.
+_CACHE_KEY_JS = """
+() => [
+  location.href,
+  document.readyState,
+  document.documentElement ? document.documentElement.childElementCount : 0,
+  (performance.getEntriesByType('navigation')[0] || {}).startTime || 0,
+  window.__mutationCounter || 0,
+]
+"""
+
+
+
+# ---------------------------------------------------------------------------
+# Legacy action-format normalizers. The LLM occasionally answers with the
+# old {"click": {"ref": "e23"}} shape; one dict lookup rewrites it instead
+# of a branchy if/elif chain duplicated per call site.
+# ---------------------------------------------------------------------------
+
+def _norm_click(value):
+    if isinstance(value, str):
+        return {"type": "click", "ref": value}
+    if isinstance(value, dict):
+        return {"type": "click", "ref": value.get('ref')}
+    return None
+
+
+def _norm_type(value):
+    if isinstance(value, dict):
+        return {"type": "type", "ref": value.get('ref'),
+                "text": value.get('text', '')}
+    return None
+
+
+def _norm_select(value):
+    if isinstance(value, dict):
+        return {"type": "select", "ref": value.get('ref'),
+                "value": value.get('value', '')}
+    return None
+
+
+def _norm_extract(value):
+    if isinstance(value, dict):
+        return {"type": "extract", "ref": value.get('ref'),
+                "variable": value.get('variable', 'result')}
+    return None
+
+
+def _norm_scroll(value):
+    if isinstance(value, dict):
+        return {"type": "scroll", "direction": value.get('direction', 'down'),
+                "amount": value.get('amount', 300)}
+    return None
+
+
+def _norm_wait(value):
+    if isinstance(value, dict):
+        if 'timeout' in value:
+            return {"type": "wait", "timeout": value['timeout']}
+        if 'selector' in value:
+            return {"type": "wait", "selector": value['selector']}
+        return {"type": "wait", "timeout": 2000}
+    return None
+
+
+_ACTION_NORMALIZERS = {
+    'click': _norm_click,
+    'type': _norm_type,
+    'select': _norm_select,
+    'extract': _norm_extract,
+    'scroll': _norm_scroll,
+    'wait': _norm_wait,
+}
+
+
+def _normalize_action(action):
+    """Rewrite a legacy-format action dict into {"type": ..., ...} form."""
+    if not action or not isinstance(action, dict) or 'type' in action:
+        return action
+    for key, fn in _ACTION_NORMALIZERS.items():
+        if key in action:
+            normalized = fn(action[key])
+            if normalized is not None:
+                return normalized
+    return action
+
+
+# System prompts are constant for the process lifetime - build the
+# message dicts once so every turn reuses identical bytes (which also
+# keeps the provider-side prompt-cache prefix byte-stable).
+_INITIAL_SYS_MSG = message_template('system', """You are a web automation assistant. Analyze the page snapshot and create a plan to accomplish the user's request.
+
+The snapshot shows the page elements in YAML format. Each element has:
+- role: The element type (button, input, link, etc.)
+- name/text: The visible text or label
+- attributes: Important properties like type, placeholder, etc.
+- [ref=eX]: Unique reference for interaction (use this exact value)
+
+Your response should be a JSON object with two fields:
+1. 'plan': An array of high-level steps to accomplish the task
+2. 'action': The first action to take, or null if task is complete
+
+Action format example:
+{
+  "plan": ["Step 1", "Step 2"],
+  "action": {
+    "type": "click",
+    "ref": "e1"
+  }
+}
+
+Available action types:
+- 'click': {"type": "click", "ref": "e1"}
+- 'type': {"type": "type", "ref": "e1", "text": "search text"}
+- 'select': {"type": "select", "ref": "e1", "value": "option"}
+- 'wait': {"type": "wait", "timeout": 2000} or {"type": "wait", "selector": "#element"}
+- 'extract': {"type": "extract", "ref": "e1", "variable": "result"}
+- 'scroll': {"type": "scroll", "direction": "down", "amount": 300}
+
+IMPORTANT: Only use 'ref' values that exist in the snapshot (e.g., ref=e1, ref=e2, etc.)""")
+
+_NEXT_SYS_MSG = message_template('system', """You are a web automation assistant. Based on the current page state and the last action's result, suggest the next action.
+
+Your response should be a JSON object with a single 'action' field containing the next action to take, or null if the task is complete.
+
+Action format example:
+{
+  "action": {
+    "type": "click",
+    "ref": "e1"
+  }
+}
+
+Available action types:
+- 'click': {"type": "click", "ref": "e1"}
+- 'type': {"type": "type", "ref": "e1", "text": "search text"}
+- 'select': {"type": "select", "ref": "e1", "value": "option"}
+- 'wait': {"type": "wait", "timeout": 2000} or {"type": "wait", "selector": "#element"}
+- 'extract': {"type": "extract", "ref": "e1", "variable": "result"}
+- 'scroll': {"type": "scroll", "direction": "down", "amount": 300}
+
+The page state may arrive as a unified diff against the previous snapshot
+("- Page Snapshot (diff)"): lines starting with '+' were added, '-' were
+removed, everything else is unchanged. Refs from the previous snapshot
+stay valid unless their line was removed.
+
+IMPORTANT: Only use 'ref' values that exist in the current snapshot.""")
+
+
 class PageSnapshot:
     def __init__(self, page):
         self.page = page
         self.snapshot_data = None
         self.element_map = {}  # Store mapping from ref to actual elements
+        # Snapshot reuse: identical (url, readyState, child count, nav
+        # start, mutation counter) means the page has not materially
+        # changed, so the previous snapshot string is still valid.
+        self._cache_key = None
+        self._cache_value = None
+        try:
+            self.page.add_init_script(_MUTATION_COUNTER_JS)
+        except Exception:
+            pass
+
+    def _compute_cache_key(self):
+        """Cheap page-state fingerprint; None disables caching."""
+        try:
+            return tuple(self.page.evaluate(_CACHE_KEY_JS))
+        except Exception:
+            return None
+
+    def invalidate(self):
+        """Drop the cached snapshot (call after DOM-mutating actions)."""
+        self._cache_key = None
+        self._cache_value = None
+
+    @staticmethod
+    def diff_against(prev: str, current: str) -> str:
+        """Unified diff between two snapshot strings, LLM-framed."""
+        diff_lines = list(difflib.unified_diff(
+            prev.splitlines(), current.splitlines(),
+            lineterm="", fromfile="prev", tofile="curr"))
+        if not diff_lines:
+            return "- Page Snapshot (no structural changes)"
+        return '\n'.join(
+            ["- Page Snapshot (diff)", "```diff"] + diff_lines + ["```"])
 
     def capture(self) -> str:
         """Capture accessibility snapshot of the current page using Playwright's built-in method"""
         try:
+            # Reuse the last snapshot when the page fingerprint is
+            # unchanged - skips the full DOM walk entirely.
+            key = self._compute_cache_key()
+            if key is not None and key == self._cache_key:
+                return self._cache_value
+
             # Wait for page to be stable
             self.page.wait_for_load_state('domcontentloaded', timeout=10000)
-            time.sleep(1)  # Additional wait to ensure page stability
+            _wait_for_dom_quiescent(self.page)
 
             # Use Playwright's built-in method (consistent with official version)
             snapshot_text = self.page.evaluate(
@@ -32,6 +264,10 @@ class PageSnapshot:
                     "```"
                 ]
                 self.snapshot_data = '\n'.join(formatted_snapshot)
+                # Key is computed *after* the walk: ref tagging mutates
+                # the DOM, so an earlier key would never match again.
+                self._cache_key = self._compute_cache_key()
+                self._cache_value = self.snapshot_data
                 return self.snapshot_data
             else:
                 # Fallback if built-in method is not available
@@ -88,11 +324,11 @@ class PlaywrightLLMAgent:
         """Navigate to a URL and capture snapshot"""
         try:
             print(f"Navigating to: {url}")
+            self.snapshot.invalidate()
             self.page.goto(url, wait_until='domcontentloaded', timeout=30000)
 
             # Wait for page to fully load
-            self.page.wait_for_load_state('networkidle', timeout=15000)
-            time.sleep(2)  # Additional wait to ensure page stability
+            _wait_for_dom_quiescent(self.page, quiet_ms=500, timeout=8000)
 
             print("Page loaded, capturing optimized snapshot...")
             return self.snapshot.capture()
@@ -105,98 +341,24 @@ class PlaywrightLLMAgent:
         List[Dict[str, Any]], Optional[Dict[str, Any]]]:
         """Get initial plan and first action from LLM"""
         messages = [
-            message_template('system', """You are a web automation assistant. Analyze the page snapshot and create a plan to accomplish the user's request.
-
-The snapshot shows the page elements in YAML format. Each element has:
-- role: The element type (button, input, link, etc.)
-- name/text: The visible text or label
-- attributes: Important properties like type, placeholder, etc.
-- [ref=eX]: Unique reference for interaction (use this exact value)
-
-Your response should be a JSON object with two fields:
-1. 'plan': An array of high-level steps to accomplish the task
-2. 'action': The first action to take, or null if task is complete
-
-Action format example:
-{
-  "plan": ["Step 1", "Step 2"],
-  "action": {
-    "type": "click",
-    "ref": "e1"
-  }
-}
-
-Available action types:
-- 'click': {"type": "click", "ref": "e1"}
-- 'type': {"type": "type", "ref": "e1", "text": "search text"}
-- 'select': {"type": "select", "ref": "e1", "value": "option"}
-- 'wait': {"type": "wait", "timeout": 2000} or {"type": "wait", "selector": "#element"}
-- 'extract': {"type": "extract", "ref": "e1", "variable": "result"}
-- 'scroll': {"type": "scroll", "direction": "down", "amount": 300}
-
-IMPORTANT: Only use 'ref' values that exist in the snapshot (e.g., ref=e1, ref=e2, etc.)"""),
+            _INITIAL_SYS_MSG,
             message_template('user',
-                             f"Page Snapshot:\n{snapshot}\n\nUser Request: {prompt}")
+                             f"User Request: {prompt}\n\nPage Snapshot:\n{snapshot}")
         ]
         print("snapshot:", snapshot)
-        response = chat_single(messages, mode="json", verbose=True)
+        # Stream so the first action is available the moment the JSON
+        # object closes; fall back to the blocking call on stream errors.
+        try:
+            response = stream_json_response(messages)
+        except Exception:
+            response = chat_single(messages, mode="json", verbose=True)
 
         if response and isinstance(response, dict):
             plan = response.get('plan', [])
             action = response.get('action', None)
 
-            # Fix action format issues
-            if action and isinstance(action, dict):
-                # Check if it's old format {"click": {"ref": "e23"}}
-                if 'type' not in action:
-                    # Try to detect action type
-                    if 'click' in action:
-                        click_value = action['click']
-                        if isinstance(click_value, str):
-                            # Handle {"click": "e23"} format
-                            action = {"type": "click", "ref": click_value}
-                        elif isinstance(click_value, dict):
-                            # Handle {"click": {"ref": "e23"}} format
-                            action = {"type": "click",
-                                      "ref": click_value.get('ref')}
-                    elif 'type' in action:
-                        type_value = action['type']
-                        if isinstance(type_value, dict):
-                            action = {"type": "type",
-                                      "ref": type_value.get('ref'),
-                                      "text": type_value.get('text', '')}
-                    elif 'select' in action:
-                        select_value = action['select']
-                        if isinstance(select_value, dict):
-                            action = {"type": "select",
-                                      "ref": select_value.get('ref'),
-                                      "value": select_value.get('value', '')}
-                    elif 'extract' in action:
-                        extract_value = action['extract']
-                        if isinstance(extract_value, dict):
-                            action = {"type": "extract",
-                                      "ref": extract_value.get('ref'),
-                                      "variable": extract_value.get('variable',
-                                                                    'result')}
-                    elif 'scroll' in action:
-                        scroll_value = action['scroll']
-                        if isinstance(scroll_value, dict):
-                            action = {"type": "scroll",
-                                      "direction": scroll_value.get(
-                                          'direction', 'down'),
-                                      "amount": scroll_value.get('amount',
-                                                                 300)}
-                    elif 'wait' in action:
-                        wait_value = action['wait']
-                        if isinstance(wait_value, dict):
-                            if 'timeout' in wait_value:
-                                action = {"type": "wait",
-                                          "timeout": wait_value['timeout']}
-                            elif 'selector' in wait_value:
-                                action = {"type": "wait",
-                                          "selector": wait_value['selector']}
-                            else:
-                                action = {"type": "wait", "timeout": 2000}
+            # Fix action format issues (legacy {"click": {...}} shapes)
+            action = _normalize_action(action)
 
             return plan, action
         else:
@@ -207,94 +369,27 @@ IMPORTANT: Only use 'ref' values that exist in the snapshot (e.g., ref=e1, ref=e
         Dict[str, Any]]:
         """Get next action from LLM based on current state"""
         messages = [
-            message_template('system', """You are a web automation assistant. Based on the current page state and the last action's result, suggest the next action.
-
-Your response should be a JSON object with a single 'action' field containing the next action to take, or null if the task is complete.
-
-Action format example:
-{
-  "action": {
-    "type": "click",
-    "ref": "e1"
-  }
-}
+            _NEXT_SYS_MSG,
+            message_template('user', f"""User Request: {prompt}
 
-Available action types:
-- 'click': {"type": "click", "ref": "e1"}
-- 'type': {"type": "type", "ref": "e1", "text": "search text"}
-- 'select': {"type": "select", "ref": "e1", "value": "option"}
-- 'wait': {"type": "wait", "timeout": 2000} or {"type": "wait", "selector": "#element"}
-- 'extract': {"type": "extract", "ref": "e1", "variable": "result"}
-- 'scroll': {"type": "scroll", "direction": "down", "amount": 300}
-
-IMPORTANT: Only use 'ref' values that exist in the current snapshot."""),
-            message_template('user', f"""Current Page Snapshot:\n{snapshot}
+Determine the next action to take or return null if the task is complete.
 
 Last Action: {last_action_result if last_action_result else 'None'}
 
-User Request: {prompt}
-
-Determine the next action to take or return null if the task is complete.""")
+Current Page Snapshot:\n{snapshot}""")
         ]
         print("Current snapshot:", snapshot)
 
-        response = chat_single(messages, mode="json", verbose=True)
+        try:
+            response = stream_json_response(messages)
+        except Exception:
+            response = chat_single(messages, mode="json", verbose=True)
 
         if response and isinstance(response, dict):
             action = response.get('action', None)
 
-            # Fix action format issues
-            if action and isinstance(action, dict):
-                # Check if it's old format {"click": {"ref": "e23"}}
-                if 'type' not in action:
-                    # Try to detect action type
-                    if 'click' in action:
-                        click_value = action['click']
-                        if isinstance(click_value, str):
-                            # Handle {"click": "e23"} format
-                            action = {"type": "click", "ref": click_value}
-                        elif isinstance(click_value, dict):
-                            # Handle {"click": {"ref": "e23"}} format
-                            action = {"type": "click",
-                                      "ref": click_value.get('ref')}
-                    elif 'type' in action:
-                        type_value = action['type']
-                        if isinstance(type_value, dict):
-                            action = {"type": "type",
-                                      "ref": type_value.get('ref'),
-                                      "text": type_value.get('text', '')}
-                    elif 'select' in action:
-                        select_value = action['select']
-                        if isinstance(select_value, dict):
-                            action = {"type": "select",
-                                      "ref": select_value.get('ref'),
-                                      "value": select_value.get('value', '')}
-                    elif 'extract' in action:
-                        extract_value = action['extract']
-                        if isinstance(extract_value, dict):
-                            action = {"type": "extract",
-                                      "ref": extract_value.get('ref'),
-                                      "variable": extract_value.get('variable',
-                                                                    'result')}
-                    elif 'scroll' in action:
-                        scroll_value = action['scroll']
-                        if isinstance(scroll_value, dict):
-                            action = {"type": "scroll",
-                                      "direction": scroll_value.get(
-                                          'direction', 'down'),
-                                      "amount": scroll_value.get('amount',
-                                                                 300)}
-                    elif 'wait' in action:
-                        wait_value = action['wait']
-                        if isinstance(wait_value, dict):
-                            if 'timeout' in wait_value:
-                                action = {"type": "wait",
-                                          "timeout": wait_value['timeout']}
-                            elif 'selector' in wait_value:
-                                action = {"type": "wait",
-                                          "selector": wait_value['selector']}
-                            else:
-                                action = {"type": "wait", "timeout": 2000}
+            # Fix action format issues (legacy {"click": {...}} shapes)
+            action = _normalize_action(action)
 
             return action
         else:
@@ -304,10 +399,106 @@ Determine the next action to take or return null if the task is complete.""")
         """Wait for page to be stable before executing actions"""
         try:
             self.page.wait_for_load_state('domcontentloaded', timeout=10000)
-            time.sleep(0.5)  # Brief wait to ensure page stability
+            _wait_for_dom_quiescent(self.page, timeout=3000)
         except Exception as e:
             print(f"Warning: Page stability check failed: {e}")
 
+    # ------------------------------------------------------------------
+    # Per-type action handlers. Each returns (result, dom_changed); the
+    # dispatcher only re-captures the snapshot when a handler reports the
+    # DOM may actually have changed, so wait/extract steps skip it.
+    # ------------------------------------------------------------------
+    def _do_click(self, action: Dict[str, Any]) -> Tuple[str, bool]:
+        ref = action.get('ref')
+        if not ref:
+            return "Error: No ref specified for click action", False
+
+        selector = ref_selector(ref)
+        print(f"Clicking element with selector: {selector}")
+
+        # page.click already waits for the element and reports a missing
+        # one - no separate count/wait probes needed. A timeout usually
+        # means the ref went stale, so re-tag via a fresh snapshot and
+        # retry once.
+        try:
+            self.page.click(selector, timeout=10000)
+        except Exception:
+            print("Element not found, refreshing snapshot...")
+            self.snapshot.invalidate()
+            self.snapshot.capture()
+            try:
+                self.page.click(selector, timeout=10000)
+            except Exception:
+                return f"Error: Element with ref '{ref}' not found", False
+
+        # Wait for page to stabilize after click
+        _wait_for_dom_quiescent(self.page)
+        return f"Successfully clicked element {ref}", True
+
+    def _do_type(self, action: Dict[str, Any]) -> Tuple[str, bool]:
+        ref = action.get('ref')
+        text = action.get('text', '')
+        if not ref:
+            return "Error: No ref specified for type action", False
+
+        selector = ref_selector(ref)
+        print(f"Typing '{text}' into element with selector: {selector}")
+
+        # fill() waits for the element itself; a missing ref surfaces
+        # through the dispatcher's except
+        self.page.fill(selector, text, timeout=10000)
+        return f"Successfully typed '{text}' into element {ref}", True
+
+    def _do_select(self, action: Dict[str, Any]) -> Tuple[str, bool]:
+        ref = action.get('ref')
+        value = action.get('value', '')
+        if not ref:
+            return "Error: No ref specified for select action", False
+
+        self.page.select_option(ref_selector(ref), value, timeout=10000)
+        return f"Successfully selected '{value}' in element {ref}", True
+
+    def _do_wait(self, action: Dict[str, Any]) -> Tuple[str, bool]:
+        if 'timeout' in action:
+            timeout = action['timeout']
+            time.sleep(timeout / 1000)  # Convert to seconds
+            return f"Waited for {timeout}ms", False
+        if 'selector' in action:
+            selector = action['selector']
+            self.page.wait_for_selector(selector, timeout=10000)
+            # Waiting *for a selector* implies the page was changing
+            return f"Waited for selector {selector}", True
+        return "Error: Wait action requires timeout or selector", False
+
+    def _do_extract(self, action: Dict[str, Any]) -> Tuple[str, bool]:
+        ref = action.get('ref')
+        if not ref:
+            return "Error: No ref specified for extract action", False
+
+        text = self.page.text_content(ref_selector(ref), timeout=10000)
+        if 'variable' in action:
+            setattr(self, action['variable'], text)
+        return f"Extracted text: {text[:100] if text else 'None'}...", False
+
+    def _do_scroll(self, action: Dict[str, Any]) -> Tuple[str, bool]:
+        direction = action.get('direction', 'down')
+        amount = action.get('amount', 300)
+        if direction == 'down':
+            self.page.evaluate(f"window.scrollBy(0, {amount})")
+        else:
+            self.page.evaluate(f"window.scrollBy(0, -{amount})")
+        _wait_for_dom_quiescent(self.page, timeout=2000)
+        return f"Scrolled {direction} by {amount}px", True
+
+    _HANDLERS = {
+        'click': _do_click,
+        'type': _do_type,
+        'select': _do_select,
+        'wait': _do_wait,
+        'extract': _do_extract,
+        'scroll': _do_scroll,
+    }
+
     def execute_action(self, action: Dict[str, Any]) -> str:
         """Execute the action suggested by LLM"""
         if not action:
@@ -319,143 +510,27 @@ Determine the next action to take or return null if the task is complete.""")
         if not action_type:
             return f"Error: No action type specified in {action}"
 
-        result = "Unknown action result"
+        handler = self._HANDLERS.get(action_type)
+        if handler is None:
+            return f"Error: Unknown action type '{action_type}'"
 
         try:
             # Ensure page is stable
             self.wait_for_page_stable()
-
-            if action_type == 'click':
-                ref = action.get('ref')
-                if not ref:
-                    return "Error: No ref specified for click action"
-
-                selector = f"[aria-ref='{ref}']"
-                print(f"Clicking element with selector: {selector}")
-
-                # Check if element exists - fix JavaScript syntax error
-                try:
-                    element_count = self.page.evaluate(f"""
-                        () => document.querySelectorAll("{selector}").length
-                    """)
-                    print(
-                        f"Found {element_count} elements with selector {selector}")
-                except Exception as eval_error:
-                    print(f"Error checking element existence: {eval_error}")
-                    # Try simple selector check
-                    try:
-                        element_count = self.page.locator(selector).count()
-                        print(
-                            f"Using locator count, found {element_count} elements")
-                    except:
-                        element_count = 0
-
-                if element_count == 0:
-                    # Try to refresh snapshot to get current element refs
-                    print("Element not found, refreshing snapshot...")
-                    self.snapshot.capture()
-                    try:
-                        element_count = self.page.locator(selector).count()
-                        print(
-                            f"After refreshing snapshot, found {element_count} elements")
-                    except:
-                        element_count = 0
-
-                if element_count == 0:
-                    return f"Error: Element with ref '{ref}' not found"
-
-                # Wait for element to be visible and click
-                self.page.wait_for_selector(selector, timeout=10000)
-                self.page.click(selector, timeout=10000)
-                result = f"Successfully clicked element {ref}"
-
-                # Wait for page to stabilize after click
-                time.sleep(2)
-
-            elif action_type == 'type':
-                ref = action.get('ref')
-                text = action.get('text', '')
-
-                if not ref:
-                    return "Error: No ref specified for type action"
-
-                selector = f"[aria-ref='{ref}']"
-                print(
-                    f"Typing '{text}' into element with selector: {selector}")
-
-                # Check if element exists
-                element_count = self.page.locator(selector).count()
-                if element_count == 0:
-                    return f"Error: Element with ref '{ref}' not found"
-
-                # Wait for element to be visible
-                self.page.wait_for_selector(selector, timeout=10000)
-                self.page.fill(selector, text, timeout=10000)
-                result = f"Successfully typed '{text}' into element {ref}"
-
-            elif action_type == 'select':
-                ref = action.get('ref')
-                value = action.get('value', '')
-
-                if not ref:
-                    return "Error: No ref specified for select action"
-
-                selector = f"[aria-ref='{ref}']"
-
-                self.page.wait_for_selector(selector, timeout=10000)
-                self.page.select_option(selector, value, timeout=10000)
-                result = f"Successfully selected '{value}' in element {ref}"
-
-            elif action_type == 'wait':
-                if 'timeout' in action:
-                    timeout = action['timeout']
-                    time.sleep(timeout / 1000)  # Convert to seconds
-                    result = f"Waited for {timeout}ms"
-                elif 'selector' in action:
-                    selector = action['selector']
-                    self.page.wait_for_selector(selector, timeout=10000)
-                    result = f"Waited for selector {selector}"
-                else:
-                    result = "Error: Wait action requires timeout or selector"
-
-            elif action_type == 'extract':
-                ref = action.get('ref')
-
-                if not ref:
-                    return "Error: No ref specified for extract action"
-
-                selector = f"[aria-ref='{ref}']"
-
-                self.page.wait_for_selector(selector, timeout=10000)
-                text = self.page.text_content(selector, timeout=10000)
-                if 'variable' in action:
-                    setattr(self, action['variable'], text)
-                result = f"Extracted text: {text[:100] if text else 'None'}..."
-
-            elif action_type == 'scroll':
-                direction = action.get('direction', 'down')
-                amount = action.get('amount', 300)
-                if direction == 'down':
-                    self.page.evaluate(f"window.scrollBy(0, {amount})")
-                else:
-                    self.page.evaluate(f"window.scrollBy(0, -{amount})")
-                result = f"Scrolled {direction} by {amount}px"
-                time.sleep(1)  # Wait after scrolling
-
-            else:
-                result = f"Error: Unknown action type '{action_type}'"
-
+            result, dom_changed = handler(self, action)
         except Exception as e:
-            result = f"Error executing {action_type}: {str(e)}"
+            result, dom_changed = f"Error executing {action_type}: {str(e)}", True
             print(f"Action execution error: {e}")
             print(f"Full error details:", e)
 
-        # Wait for page to stabilize after action, then update snapshot
-        try:
-            self.wait_for_page_stable()
-            self.snapshot.capture()
-        except Exception as e:
-            print(f"Error updating snapshot after action: {e}")
+        # Only pay for a fresh snapshot when the DOM may have changed
+        if dom_changed:
+            try:
+                self.snapshot.invalidate()
+                self.wait_for_page_stable()
+                self.snapshot.capture()
+            except Exception as e:
+                print(f"Error updating snapshot after action: {e}")
 
         return result
 
@@ -470,7 +545,7 @@ Determine the next action to take or return null if the task is complete.""")
 
             self.plan, action = self.get_initial_plan(prompt, snapshot)
             print("\nPlan:",
-                  json.dumps(self.plan, indent=2, ensure_ascii=False))
+                  json_dumps(self.plan, indent=True))
 
             # 2. Execute action sequence
             max_actions = 15  # Increase maximum action count
@@ -480,7 +555,7 @@ Determine the next action to take or return null if the task is complete.""")
                 # Execute current action
                 result = self.execute_action(action)
                 print(
-                    f"\nExecuted action: {json.dumps(action, indent=2, ensure_ascii=False)}")
+                    f"\nExecuted action: {json_dumps(action, indent=True)}")
                 print(f"Result: {result}")
 
                 # If action failed, try to get new snapshot
@@ -489,13 +564,22 @@ Determine the next action to take or return null if the task is complete.""")
                     time.sleep(2)
 
                 # Get new page state
+                prev_snapshot = snapshot
                 snapshot = self.snapshot.capture()
                 if "Error:" in snapshot:
                     print("Could not capture snapshot, stopping...")
                     break
 
+                # Prompt tokens are the step bottleneck: send a diff when
+                # it is smaller than re-sending the whole snapshot.
+                llm_snapshot = snapshot
+                if "Error" not in prev_snapshot:
+                    diff = self.snapshot.diff_against(prev_snapshot, snapshot)
+                    if len(diff) < len(snapshot):
+                        llm_snapshot = diff
+
                 # Get next action
-                action = self.get_next_action(prompt, snapshot, result)
+                action = self.get_next_action(prompt, llm_snapshot, result)
                 action_count += 1
 
             if action_count >= max_actions:
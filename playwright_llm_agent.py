@@ -1,92 +1,63 @@
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
+import logging
 from typing import Dict, List, Optional, Any, Tuple, Union
 import yaml
-from chat_py import chat_single, message_template, print_color
+from chat_py import chat_single, json_dumps, message_template, \
+    print_color, stream_json_response
 import time
 import subprocess
 import os
 from pathlib import Path
-from snapshot import PageSnapshot
-
-
-
-
-class PlaywrightLLMAgent:
-    def __init__(self, user_data_dir: Optional[str] = None):
-        """Create a new Playwright-powered LLM agent.
-
-        Parameters
-        ----------
-        user_data_dir : str, optional
-            Path to a **Chromium user-data directory**. When provided the
-            agent launches a *persistent* browser context so cookies, local
-            storage and other session data are reused across runs. When
-            omitted, a regular incognito context is used.
-        """
-
-        self.playwright = sync_playwright().start()
-
-        if user_data_dir:
-            # Ensure directory exists
-            from pathlib import Path as _Path
-            _path = _Path(user_data_dir)
-            _path.mkdir(parents=True, exist_ok=True)
-
-            # Launch persistent context (returns BrowserContext)
-            self.context = self.playwright.chromium.launch_persistent_context(
-                user_data_dir=str(_path),
-                headless=False,
-            )
-            # In persistent mode .browser attr is available for later close
-            self.browser = self.context.browser
-        else:
-            # Ephemeral browser+context (previous default behaviour)
-            self.browser = self.playwright.chromium.launch(headless=False)
-            self.context = self.browser.new_context()
-
-        # Create / reuse a page
-        if self.context.pages:
-            self.page = self.context.pages[0]
-        else:
-            self.page = self.context.new_page()
-
-        self.snapshot = PageSnapshot(self.page)
-        self.plan = None
-        self.current_action_index = 0
-        self._cdp_endpoint = None
-        self.action_history = []  # Store history of actions and their results
-
-    def navigate(self, url: str) -> str:
-        """Navigate to a URL and capture snapshot"""
-        try:
-            print(f"Navigating to: {url}")
-            start_time = time.time()
-
-            self.page.goto(url, wait_until='domcontentloaded', timeout=20000)
-
-            # Optimized loading wait - try networkidle but don't block too long
-            try:
-                self.page.wait_for_load_state('networkidle', timeout=5000)
-            except:
-                print("Networkidle timeout, proceeding anyway...")
-
-            print(
-                f"Page loaded in {time.time() - start_time:.2f}s, capturing snapshot...")
-            return self.snapshot.capture(
-                force_refresh=True)  # Force refresh on navigation
-
-        except Exception as e:
-            print(f"Error navigating to {url}: {e}")
-            return "Error: Could not navigate to page"
+from snapshot import PageSnapshot, ref_selector
+
+logger = logging.getLogger(__name__)
+
+# AGENT_VERBOSE=1 restores the old chatty stdout behaviour (full prompts,
+# per-strategy failures, snapshot timings) for debugging sessions.
+_VERBOSE = os.getenv("AGENT_VERBOSE", "") == "1"
+if _VERBOSE:
+    logging.basicConfig(level=logging.DEBUG)
+
+
+# Injected into every document before load: counts in-flight fetch/XHR
+# requests so Python can wait for true network quiescence instead of
+# sleeping a fixed pad.
+_NETWORK_MONITOR_JS = """
+(() => {
+  if (window.__pwNetMonitor) return;
+  window.__pwNetMonitor = true;
+  window.__pendingReq = 0;
+  window.__lastReqEnd = performance.now();
+  const done = () => {
+    window.__pendingReq = Math.max(0, window.__pendingReq - 1);
+    window.__lastReqEnd = performance.now();
+  };
+  const origFetch = window.fetch;
+  if (origFetch) {
+    window.fetch = function (...args) {
+      window.__pendingReq++;
+      return origFetch.apply(this, args).then(
+        (r) => { done(); return r; },
+        (e) => { done(); throw e; }
+      );
+    };
+  }
+  const origSend = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function (...args) {
+    window.__pendingReq++;
+    this.addEventListener('loadend', done, { once: true });
+    return origSend.apply(this, args);
+  };
+})();
+"""
 
-    def _get_llm_response(self, prompt: str, snapshot: str,
-                          action_history: Optional[List[Dict[str, Any]]] = None,
-                          is_initial: bool = True) -> Optional[Dict[str, Any]]:
-        """Get response from LLM - unified method for prompts"""
 
-        # Common action types description
-        action_types = """
+# System prompts are constant across the whole action loop; build the
+# strings and their message dicts once at import instead of per LLM call.
+_ACTION_TYPES = """
 Available action types:
 - 'click': {"type": "click", "ref": "e1"} or {"type": "click", "text": "Button Text"} or {"type": "click", "selector": "button"}
 - 'type': {"type": "type", "ref": "e1", "text": "search text"} or {"type": "type", "selector": "input", "text": "search text"}
@@ -107,10 +78,11 @@ IMPORTANT:
 - click can choose radio, checkbox...
 """
 
-        if is_initial:
-            system_prompt = """You are a web automation assistant. Analyze the page snapshot and create a plan to accomplish the user's request.
+_SYS_INITIAL = """You are a web automation assistant. Analyze the page snapshot and create a plan to accomplish the user's request.
 
-The snapshot shows the page elements in YAML format. Each element has:
+The snapshot shows the page elements in YAML format (or, when marked
+"- Page Snapshot (json)", as a compact JSON map of ref -> [role, name]).
+Each element has:
 - role: The element type (button, input, link, etc.)
 - name/text: The visible text or label
 - attributes: Important properties like type, placeholder, etc.
@@ -137,13 +109,14 @@ If task is already complete:
     "ref": null,
     "summary": "Task was already completed. Summary of what was found..."
   }
-}""" + action_types
-            user_prompt = f"Page Snapshot:\n{snapshot}\n\nUser Request: {prompt}"
-        else:
-            system_prompt = """You are a web automation assistant. Based on the current page state and the history of actions taken, suggest the next action.
+}""" + _ACTION_TYPES
+
+_SYS_NEXT = """You are a web automation assistant. Based on the current page state and the history of actions taken, suggest the next action.
 
 Your response should be a JSON object with a single 'action' field containing the next action to take. If the task is complete, use the 'finish' action type with a summary.
 
+The snapshot may arrive as "- Page Snapshot (diff)" - a unified diff against the previous snapshot you saw. Unchanged elements keep the refs you already know; only apply the +/- lines on top of your mental model of the page.
+
 Action format examples:
 {
   "action": {
@@ -160,38 +133,266 @@ When task is complete:
     "ref": null,
     "summary": "Successfully completed the task. Summary of what was accomplished..."
   }
-}""" + action_types
-            
-            # Format action history
+}""" + _ACTION_TYPES
+
+_SYS_INITIAL_MSG = message_template('system', _SYS_INITIAL)
+_SYS_NEXT_MSG = message_template('system', _SYS_NEXT)
+
+
+# Normalizers for legacy action shapes like {"click": {"ref": "e23"}} or
+# {"click": "e23"}; each returns the canonical {"type": ...} dict, or None
+# when the value shape is unrecognized.
+def _norm_click(value):
+    if isinstance(value, str):
+        return {"type": "click", "ref": value}
+    if isinstance(value, dict):
+        return {"type": "click", "ref": value.get('ref')}
+    return None
+
+
+def _norm_type(value):
+    if isinstance(value, dict):
+        return {"type": "type", "ref": value.get('ref'),
+                "text": value.get('text', '')}
+    return None
+
+
+def _norm_select(value):
+    if isinstance(value, dict):
+        return {"type": "select", "ref": value.get('ref'),
+                "value": value.get('value', '')}
+    return None
+
+
+def _norm_extract(value):
+    if isinstance(value, dict):
+        return {"type": "extract", "ref": value.get('ref'),
+                "variable": value.get('variable', 'result')}
+    return None
+
+
+def _norm_scroll(value):
+    if isinstance(value, dict):
+        return {"type": "scroll",
+                "direction": value.get('direction', 'down'),
+                "amount": value.get('amount', 300)}
+    return None
+
+
+def _norm_wait(value):
+    if isinstance(value, dict):
+        if 'timeout' in value:
+            return {"type": "wait", "timeout": value['timeout']}
+        if 'selector' in value:
+            return {"type": "wait", "selector": value['selector']}
+        return {"type": "wait", "timeout": 2000}
+    return None
+
+
+def _norm_finish(value):
+    if isinstance(value, dict):
+        return {"type": "finish", "ref": None,
+                "summary": value.get('summary', 'Task completed')}
+    return {"type": "finish", "ref": None,
+            "summary": str(value) if value else 'Task completed'}
+
+
+_ACTION_NORMALIZERS = {
+    'click': _norm_click,
+    'type': _norm_type,
+    'select': _norm_select,
+    'extract': _norm_extract,
+    'scroll': _norm_scroll,
+    'wait': _norm_wait,
+    'finish': _norm_finish,
+}
+
+
+class PlaywrightLLMAgent:
+    def __init__(self, user_data_dir: Optional[str] = "./.pw_profile"):
+        """Create a new Playwright-powered LLM agent.
+
+        Parameters
+        ----------
+        user_data_dir : str, optional
+            Path to a **Chromium user-data directory**. The agent launches
+            a *persistent* browser context there so cookies, local storage
+            and the on-disk HTTP cache are reused across runs - repeat
+            navigations hit the disk cache instead of re-downloading every
+            asset. Defaults to ``./.pw_profile``; pass ``None`` to force a
+            throwaway incognito context.
+        """
+
+        # Background telemetry, extension loads and the component updater
+        # all fire network requests that keep the idle barrier busy and
+        # bump the mutation rev for nothing - strip them at launch.
+        launch_args = [
+            '--disable-background-networking',
+            '--disable-extensions',
+            '--disable-background-timer-throttling',
+            '--disable-renderer-backgrounding',
+            '--disable-features=TranslateUI,BlinkGenPropertyTrees',
+            # 256MB on-disk HTTP cache so warm navigations skip the network
+            '--disk-cache-size=268435456',
+        ]
+
+        self.playwright = sync_playwright().start()
+
+        if user_data_dir:
+            # Ensure directory exists
+            from pathlib import Path as _Path
+            _path = _Path(user_data_dir)
+            _path.mkdir(parents=True, exist_ok=True)
+
+            # Launch persistent context (returns BrowserContext)
+            self.context = self.playwright.chromium.launch_persistent_context(
+                user_data_dir=str(_path),
+                headless=False,
+                args=launch_args,
+                service_workers='block',
+                bypass_csp=True,
+            )
+            # In persistent mode .browser attr is available for later close
+            self.browser = self.context.browser
+        else:
+            # Ephemeral browser+context (previous default behaviour)
+            self.browser = self.playwright.chromium.launch(
+                headless=False, args=launch_args)
+            # Blocking service workers keeps their background fetches from
+            # holding the network-idle barrier open forever.
+            self.context = self.browser.new_context(
+                service_workers='block', bypass_csp=True)
+
+        # Create / reuse a page
+        if self.context.pages:
+            self.page = self.context.pages[0]
+        else:
+            self.page = self.context.new_page()
+
+        # Register the request counter before any page scripts run
+        self.context.add_init_script(_NETWORK_MONITOR_JS)
+
+        self.snapshot = PageSnapshot(self.page)
+        self.plan = None
+        self.current_action_index = 0
+        self._cdp_endpoint = None
+        # Warm CDP session shared by the hot paths below: raw protocol
+        # sends skip Playwright's handler traversal and marshaling, so a
+        # mutation-rev read or mouse click is one websocket write.
+        try:
+            self.cdp = self.context.new_cdp_session(self.page)
+        except Exception:
+            self.cdp = None  # non-chromium driver: generic API fallbacks
+        self.action_history = []  # Store history of actions and their results
+        # Single worker for speculative LLM planning: the request is pure
+        # network I/O, so it can run while the main thread drives the page.
+        self._llm_executor = ThreadPoolExecutor(max_workers=1)
+        # Next-action memo keyed by (prompt, snapshot hash, last result):
+        # a stalled loop on an unchanged page replays the same answer
+        # without paying another LLM round trip.
+        self._next_action_cache: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def navigate(self, url: str) -> str:
+        """Navigate to a URL and capture snapshot"""
+        try:
+            print(f"Navigating to: {url}")
+            start_time = time.time()
+
+            # Scoped wait: DOMContentLoaded unblocks goto, the 'load'
+            # event is given a bounded grace period, and the idle barrier
+            # tops out at 3s - ad-heavy pages that never settle no longer
+            # stall the whole command.
+            try:
+                with self.page.expect_event('load', timeout=10000):
+                    self.page.goto(url, wait_until='domcontentloaded',
+                                   timeout=15000)
+            except PlaywrightTimeout:
+                pass  # 'load' can lag forever on ad-heavy sites; proceed
+
+            self._wait_for_network_idle(idle_ms=500, timeout=3000)
+
+            print(
+                f"Page loaded in {time.time() - start_time:.2f}s, capturing snapshot...")
+            return self.snapshot.capture(
+                force_refresh=True)  # Force refresh on navigation
+
+        except Exception as e:
+            print(f"Error navigating to {url}: {e}")
+            return "Error: Could not navigate to page"
+
+    def _wait_for_network_idle(self, idle_ms: int = 500,
+                               timeout: int = 10000) -> None:
+        """Return as soon as no fetch/XHR has been in flight for `idle_ms`.
+
+        Replaces the fixed time.sleep pads: a quiescent page passes almost
+        immediately, and a long-polling page degrades deterministically to
+        the timeout instead of blocking forever.
+        """
+        try:
+            self.page.wait_for_function(
+                "(idle) => window.__pendingReq === undefined"
+                " || (window.__pendingReq === 0"
+                " && performance.now() - window.__lastReqEnd >= idle)",
+                arg=idle_ms, timeout=timeout)
+        except Exception:
+            pass  # hard ceiling reached; proceed with whatever state we have
+
+    def _get_llm_response(self, prompt: str, snapshot: str,
+                          action_history: Optional[List[Dict[str, Any]]] = None,
+                          is_initial: bool = True) -> Optional[Dict[str, Any]]:
+        """Get response from LLM - unified method for prompts"""
+
+        # Stable content leads, the snapshot trails: provider prefix
+        # caching only matches on identical prefixes, so the request text
+        # (fixed per session) and the append-only history must come before
+        # the part that changes every turn.
+        if is_initial:
+            user_prompt = f"User Request: {prompt}\n\nPage Snapshot:\n{snapshot}"
+        else:
+
+            # Format action history. Each entry is serialized once and
+            # the line cached on the entry itself - without this, every
+            # LLM turn re-ran json.dumps over the whole history.
             history_text = "None"
             if action_history:
                 history_lines = []
                 for i, entry in enumerate(action_history, 1):
-                    action = entry.get('action', {})
-                    result = entry.get('result', '')
-                    success = entry.get('success', False)
-                    status = "✅ SUCCESS" if success else "❌ FAILED"
-                    history_lines.append(f"{i}. {status} - Action: {json.dumps(action, ensure_ascii=False)} | Result: {result}")
+                    line = entry.get('_line')
+                    if line is None:
+                        status = "✅ SUCCESS" if entry.get('success', False) \
+                            else "❌ FAILED"
+                        line = (f"{status} - Action: "
+                                f"{json_dumps(entry.get('action', {}))}"
+                                f" | Result: {entry.get('result', '')}")
+                        entry['_line'] = line
+                    history_lines.append(f"{i}. {line}")
                 history_text = "\n".join(history_lines)
-            
-            user_prompt = f"""Current Page Snapshot:\n{snapshot}
+
+            user_prompt = f"""User Request: {prompt}
+
+Determine the next action to take. If the task is complete, use 'finish' action with a summary of what was accomplished.
 
 Action History:
 {history_text}
 
-User Request: {prompt}
-
-Determine the next action to take. If the task is complete, use 'finish' action with a summary of what was accomplished.
+Current Page Snapshot:
+{snapshot}
 """
-        print_color(user_prompt,"purple")
+        if _VERBOSE:
+            print_color(user_prompt, "purple")
         messages = [
-            message_template('system', system_prompt),
+            _SYS_INITIAL_MSG if is_initial else _SYS_NEXT_MSG,
             message_template('user', user_prompt)
         ]
 
-        print(
-            f"Sending {'initial plan' if is_initial else 'next action'} request to LLM")
-        response = chat_single(messages, mode="json", verbose=True,model='gpt-4o')
+        logger.debug("Sending %s request to LLM",
+                     'initial plan' if is_initial else 'next action')
+        try:
+            response = self._stream_json_response(messages)
+        except Exception as e:
+            print(f"Streaming LLM call failed ({e}), using blocking call")
+            response = chat_single(messages, mode="json", verbose=_VERBOSE,
+                                   model='gpt-4o')
 
         # Ensure we return a dict or None
         if isinstance(response, dict):
@@ -199,65 +400,34 @@ Determine the next action to take. If the task is complete, use 'finish' action
         else:
             return None
 
+    @staticmethod
+    def _stream_json_response(messages) -> Optional[Dict[str, Any]]:
+        """Stream the completion, returning as soon as the JSON closes."""
+        response = stream_json_response(messages, model='gpt-4o')
+        if _VERBOSE and response is not None:
+            print_color(json_dumps(response), 'blue')
+        return response
+
     def _fix_action_format(self, action: Optional[Dict[str, Any]]) -> Optional[
         Dict[str, Any]]:
-        """Fix action format issues from LLM response"""
+        """Fix action format issues from LLM response.
+
+        Legacy shapes like {"click": "e23"} are rewritten to the canonical
+        {"type": ..., ...} form via a dispatch table - one dict lookup
+        instead of a chain of key/isinstance checks.
+        """
         if not action or not isinstance(action, dict):
             return action
 
-        # Check if it's old format {"click": {"ref": "e23"}}
-        if 'type' not in action:
-            # Try to detect action type
-            if 'click' in action:
-                click_value = action['click']
-                if isinstance(click_value, str):
-                    action = {"type": "click", "ref": click_value}
-                elif isinstance(click_value, dict):
-                    action = {"type": "click", "ref": click_value.get('ref')}
-            elif 'type' in action:
-                type_value = action['type']
-                if isinstance(type_value, dict):
-                    action = {"type": "type", "ref": type_value.get('ref'),
-                              "text": type_value.get('text', '')}
-            elif 'select' in action:
-                select_value = action['select']
-                if isinstance(select_value, dict):
-                    action = {"type": "select", "ref": select_value.get('ref'),
-                              "value": select_value.get('value', '')}
-            elif 'extract' in action:
-                extract_value = action['extract']
-                if isinstance(extract_value, dict):
-                    action = {"type": "extract",
-                              "ref": extract_value.get('ref'),
-                              "variable": extract_value.get('variable',
-                                                            'result')}
-            elif 'scroll' in action:
-                scroll_value = action['scroll']
-                if isinstance(scroll_value, dict):
-                    action = {"type": "scroll",
-                              "direction": scroll_value.get('direction',
-                                                            'down'),
-                              "amount": scroll_value.get('amount', 300)}
-            elif 'wait' in action:
-                wait_value = action['wait']
-                if isinstance(wait_value, dict):
-                    if 'timeout' in wait_value:
-                        action = {"type": "wait",
-                                  "timeout": wait_value['timeout']}
-                    elif 'selector' in wait_value:
-                        action = {"type": "wait",
-                                  "selector": wait_value['selector']}
-                    else:
-                        action = {"type": "wait", "timeout": 2000}
-            elif 'finish' in action:
-                finish_value = action['finish']
-                if isinstance(finish_value, dict):
-                    action = {"type": "finish", "ref": None,
-                              "summary": finish_value.get('summary',
-                                                          'Task completed')}
-                else:
-                    action = {"type": "finish", "ref": None, "summary": str(
-                        finish_value) if finish_value else 'Task completed'}
+        if 'type' in action:
+            return action
+
+        for key, value in action.items():
+            normalizer = _ACTION_NORMALIZERS.get(key)
+            if normalizer is not None:
+                fixed = normalizer(value)
+                if fixed is not None:
+                    return fixed
 
         return action
 
@@ -277,12 +447,31 @@ Determine the next action to take. If the task is complete, use 'finish' action
     def get_next_action(self, prompt: str, snapshot: str) -> Optional[
         Dict[str, Any]]:
         """Get next action from LLM based on current state"""
+        last_result = (self.action_history[-1].get('result', '')
+                       if self.action_history else '')
+        # Failed actions are not cacheable: the retry deserves fresh advice.
+        cacheable = 'Error' not in last_result
+        key = None
+        if cacheable:
+            snap_hash = hashlib.blake2b(snapshot.encode(),
+                                        digest_size=16).hexdigest()
+            key = (prompt, snap_hash, last_result)
+            cached = self._next_action_cache.get(key)
+            if cached is not None:
+                logger.debug("Reusing cached next action (identical page state)")
+                return dict(cached)
+
         response = self._get_llm_response(prompt, snapshot, action_history=self.action_history,
                                           is_initial=False)
 
         if response and isinstance(response, dict):
             action = response.get('action', None)
             action = self._fix_action_format(action)
+            if cacheable and isinstance(action, dict):
+                if len(self._next_action_cache) >= 128:
+                    self._next_action_cache.pop(
+                        next(iter(self._next_action_cache)))
+                self._next_action_cache[key] = dict(action)
             return action
         else:
             return None
@@ -291,9 +480,113 @@ Determine the next action to take. If the task is complete, use 'finish' action
         """Wait for page to be stable before executing actions - optimized"""
         try:
             self.page.wait_for_load_state('domcontentloaded', timeout=3000)
-            # Removed sleep for faster execution
+            self._wait_for_network_idle(idle_ms=300, timeout=3000)
         except Exception as e:
-            print(f"Warning: Page stability check failed: {e}")
+            logger.debug("Page stability check failed: %s", e)
+
+    def _dom_rev(self) -> Optional[int]:
+        """Current DOM mutation revision, or None if the monitor is absent."""
+        try:
+            if self.cdp is not None:
+                result = self.cdp.send(
+                    "Runtime.evaluate",
+                    {"expression":
+                        "window.__domRev === undefined ? null : window.__domRev",
+                     "returnByValue": True})
+                return result.get("result", {}).get("value")
+            return self.page.evaluate(
+                "() => window.__domRev === undefined ? null : window.__domRev")
+        except Exception:
+            return None
+
+    def _raw_click(self, x: float, y: float) -> None:
+        """Dispatch a mouse click at page coordinates.
+
+        Goes straight to Input.dispatchMouseEvent when the CDP session is
+        up - two protocol writes, no action-layer overhead - and falls
+        back to page.mouse.click otherwise.
+        """
+        if self.cdp is not None:
+            base = {"x": x, "y": y, "button": "left", "clickCount": 1}
+            self.cdp.send("Input.dispatchMouseEvent",
+                          {**base, "type": "mousePressed"})
+            self.cdp.send("Input.dispatchMouseEvent",
+                          {**base, "type": "mouseReleased"})
+        else:
+            self.page.mouse.click(x, y)
+
+    def _wait_for_dom_change(self, prev_rev: Optional[int],
+                             timeout: int = 2000) -> None:
+        """Wait until the mutation counter moves past `prev_rev`.
+
+        A click that mutates the DOM satisfies this within milliseconds; a
+        click that changes nothing simply times out, which we treat as
+        "no change" rather than an error.
+        """
+        if prev_rev is None:
+            self._wait_for_network_idle(timeout=timeout)
+            return
+        try:
+            self.page.wait_for_function("r => window.__domRev !== r",
+                                        arg=prev_rev, timeout=timeout)
+        except Exception:
+            pass  # no mutation observed: nothing to wait for
+
+    def _probe_first(self, selectors: List[str]) -> Dict[str, Any]:
+        """First matching selector's click point, batched into one evaluate.
+
+        The whole strategy list travels in a single IPC message instead of
+        one round trip per selector, so a miss cascade costs the same as a
+        first-try hit. Scrolls the winner into view as a side effect; only
+        valid for CSS selectors (not Playwright text= engines).
+        """
+        if not selectors:
+            return {"ok": False}
+        try:
+            return self.page.evaluate(
+                """(sels) => {
+                    for (let i = 0; i < sels.length; i++) {
+                        let e = null;
+                        try { e = document.querySelector(sels[i]); }
+                        catch (err) { continue; }
+                        if (!e) continue;
+                        if (e.scrollIntoViewIfNeeded) e.scrollIntoViewIfNeeded();
+                        else e.scrollIntoView({ block: 'center' });
+                        const r = e.getBoundingClientRect();
+                        return { ok: true, index: i,
+                                 visible: r.width > 0 && r.height > 0,
+                                 x: r.x + r.width / 2,
+                                 y: r.y + r.height / 2 };
+                    }
+                    return { ok: false };
+                }""", selectors)
+        except Exception:
+            return {"ok": False}
+
+    def _resolve_element(self, selector: str, timeout: int = 3000,
+                         retry_with_refresh: bool = False):
+        """Wait for `selector` and return its ElementHandle, or None.
+
+        One wait_for_selector round trip replaces the old count() probe +
+        click re-resolution pair. When `retry_with_refresh` is set a miss
+        triggers one forced snapshot refresh (re-tagging aria-refs) before
+        a second attempt.
+        """
+        try:
+            return self.page.wait_for_selector(selector, timeout=timeout,
+                                               state='visible')
+        except PlaywrightTimeout:
+            if retry_with_refresh:
+                try:
+                    self.snapshot.capture(force_refresh=True)
+                    return self.page.wait_for_selector(selector,
+                                                       timeout=timeout,
+                                                       state='visible')
+                except Exception:
+                    pass
+            return None
+        except Exception:
+            return None
 
     def execute_manual_action(self, action: Dict[str, Any]) -> str:
         """Execute manually input action (for demo usage)"""
@@ -322,9 +615,9 @@ Determine the next action to take. If the task is complete, use 'finish' action
             try:
                 self.page.wait_for_load_state('domcontentloaded', timeout=3000)
             except Exception:
-                print("Quick stability check timeout, proceeding anyway…")
+                logger.debug("Quick stability check timeout, proceeding anyway…")
 
-            print("获取当前页面snapshot… (method:", method, ")")
+            logger.debug("获取当前页面snapshot… (method: %s)", method)
 
             # ---------------------------------------------
             # Forced methods
@@ -334,24 +627,25 @@ Determine the next action to take. If the task is complete, use 'finish' action
                 if snapshot_text:
                     formatted = self.snapshot._format_snapshot(snapshot_text)
                     self.snapshot._update_cache(self.page.url, formatted)
-                    print(
-                        f"Snapshot获取完成 (Node.js)，耗时: {time.time() - start_time:.2f}s")
+                    logger.debug("Snapshot获取完成 (Node.js)，耗时: %.2fs",
+                                 time.time() - start_time)
                     return formatted
                 else:
-                    print(
+                    logger.debug(
                         "Node.js snapshot failed, falling back to auto capture…")
 
             elif method == "direct":
                 snapshot_text = self.snapshot._get_snapshot_direct(
                     all_elements=include_all)
                 if snapshot_text:
-                    formatted = self.snapshot._format_snapshot(snapshot_text)
+                    # Already formatted on the JS side
+                    formatted = snapshot_text
                     self.snapshot._update_cache(self.page.url, formatted)
-                    print(
-                        f"Snapshot获取完成 (direct)，耗时: {time.time() - start_time:.2f}s")
+                    logger.debug("Snapshot获取完成 (direct)，耗时: %.2fs",
+                                 time.time() - start_time)
                     return formatted
                 else:
-                    print(
+                    logger.debug(
                         "Direct snapshot failed, falling back to auto capture…")
 
             elif method != "auto":
@@ -363,8 +657,8 @@ Determine the next action to take. If the task is complete, use 'finish' action
             # respects the include_all flag for direct snapshot.
             # ---------------------------------------------
             result = self.snapshot.capture(include_all=include_all)
-            print(
-                f"Snapshot获取完成 (auto)，耗时: {time.time() - start_time:.2f}s")
+            logger.debug("Snapshot获取完成 (auto)，耗时: %.2fs",
+                         time.time() - start_time)
             return result
 
         except Exception as e:
@@ -377,7 +671,7 @@ Determine the next action to take. If the task is complete, use 'finish' action
             return "No action to execute"
 
         action_type = action.get('type')
-        print(f"Executing action: {action}")
+        logger.debug("Executing action: %s", action)
 
         if not action_type:
             return f"Error: No action type specified in {action}"
@@ -397,96 +691,77 @@ Determine the next action to take. If the task is complete, use 'finish' action
                 if not ref and not text and not selector:
                     return "Error: No ref, text, or selector specified for click action"
 
-                # Try to find element using multiple strategies
-                success = False
-
-                # Strategy 1: Use provided selector
-                if selector and not success:
-                    try:
-                        print(f"Trying to click with selector: {selector}")
-                        element_count = self.page.locator(selector).count()
-                        print(f"Found {element_count} elements with selector")
-
-                        if element_count > 0:
-                            self.page.click(selector, timeout=5000,
-                                            force=True)  # 强制点击
-                            success = True
-                            result = f"Successfully clicked element using selector {selector} (force)"
-                    except Exception as e:
-                        print(f"Selector strategy failed: {e}")
+                # Fail fast on refs the current snapshot does not contain -
+                # a dict hit instead of a CDP probe
+                if (ref and not text and not selector
+                        and self.snapshot.ref_index
+                        and ref not in self.snapshot.ref_index):
+                    return f"Error: ref '{ref}' not present in current snapshot"
+
+                prev_rev = self._dom_rev()
+
+                strategies = []
+                if selector:
+                    strategies.append(selector)
+                if text:
+                    strategies.append(f'text="{text}"')
+                if ref:
+                    strategies.append(
+                        self.snapshot.ref_selectors.get(ref)
+                        or ref_selector(ref))
 
-                # Strategy 2: Use text content
-                if text and not success:
+                success = False
+                # Fast path: probe every CSS strategy in one evaluate and
+                # raw-mouse-click the first visible hit - no per-strategy
+                # round trips, no selector re-resolution.
+                css_strategies = [s for s in strategies
+                                  if not s.startswith('text=')]
+                probe = self._probe_first(css_strategies)
+                if probe.get('ok') and probe.get('visible'):
+                    sel = css_strategies[probe['index']]
                     try:
-                        text_selector = f'text="{text}"'
-                        print(f"Trying to click by text: {text_selector}")
-                        element_count = self.page.locator(
-                            text_selector).count()
-                        print(
-                            f"Found {element_count} elements with text selector")
-
-                        if element_count > 0:
-                            self.page.click(text_selector, timeout=5000,
-                                            force=True)  # 强制点击
-                            success = True
-                            result = f"Successfully clicked element using text '{text}' (force)"
+                        self._raw_click(probe['x'], probe['y'])
+                        success = True
+                        result = f"Successfully clicked element via {sel} (probe)"
                     except Exception as e:
-                        print(f"Text strategy failed: {e}")
+                        logger.debug("Probe click via %s failed: %s", sel, e)
 
-                # Strategy 3: Try aria-ref attribute
-                if ref and not success:
-                    try:
-                        aria_selector = f"[aria-ref='{ref}']"
-                        print(
-                            f"Trying to click element with aria-ref: {aria_selector}")
-                        element_count = self.page.locator(
-                            aria_selector).count()
-                        print(
-                            f"Found {element_count} elements with aria-ref selector")
-
-                        if element_count > 0:
-                            self.page.click(aria_selector, timeout=5000,
-                                            force=True)  # 强制点击
+                if not success:
+                    for sel in strategies:
+                        # Refresh the snapshot once if the aria-ref went stale
+                        retry = sel is strategies[-1] and bool(ref)
+                        handle = self._resolve_element(sel,
+                                                       retry_with_refresh=retry)
+                        if handle is None:
+                            continue
+                        try:
+                            handle.click(timeout=5000, force=True)  # 强制点击
                             success = True
-                            result = f"Successfully clicked element {ref} using aria-ref (force)"
-                    except Exception as e:
-                        print(f"aria-ref strategy failed: {e}")
+                            result = f"Successfully clicked element via {sel} (force)"
+                            break
+                        except Exception as e:
+                            logger.debug("Click via %s failed: %s", sel, e)
 
-                # Strategy 4: Try to find by extracting text from ref and using text selector
+                # Fallback: extract visible text for the ref from the last
+                # snapshot and click by text
                 if ref and not success:
                     try:
-                        # Look for text pattern in the most recent snapshot
-                        snapshot_text = self.snapshot.snapshot_data or ""
-                        lines = snapshot_text.split('\n')
-                        target_text = None
-
-                        for line in lines:
-                            if f"[ref={ref}]" in line:
-                                # Extract text from line like: - button "Search" [ref=e123]
-                                import re
-                                match = re.search(r'"([^"]+)"', line)
-                                if match:
-                                    target_text = match.group(1)
-                                    break
+                        # Precomputed in _update_cache: O(1) per click.
+                        target_text = self.snapshot.ref_to_text.get(ref)
 
                         if target_text:
                             print(
                                 f"Extracted text from snapshot, trying to click: '{target_text}'")
-                            text_selector = f'text="{target_text}"'
-                            element_count = self.page.locator(
-                                text_selector).count()
-                            print(
-                                f"Found {element_count} elements with extracted text selector")
-
-                            if element_count > 0:
-                                self.page.click(text_selector, timeout=5000,
-                                                force=True)  # 强制点击
+                            handle = self._resolve_element(
+                                f'text="{target_text}"')
+                            if handle is not None:
+                                handle.click(timeout=5000, force=True)  # 强制点击
                                 success = True
                                 result = f"Successfully clicked element {ref} using extracted text (force)"
                     except Exception as e:
-                        print(f"Text extraction strategy failed: {e}")
+                        logger.debug("Text extraction strategy failed: %s", e)
 
-                # Strategy 5: Try common button/link patterns as fallback
+                # Last resort: first common button/link element
                 if not success:
                     try:
                         common_selectors = [
@@ -495,25 +770,23 @@ Determine the next action to take. If the task is complete, use 'finish' action
                         ]
 
                         for sel in common_selectors:
-                            elements = self.page.locator(sel)
-                            count = elements.count()
-                            if count > 0:
+                            handle = self.page.query_selector(sel)
+                            if handle is not None:
                                 print(
-                                    f"Found {count} {sel} elements, trying the first one")
-                                elements.first.click(timeout=3000,
-                                                     force=True)  # 强制点击
+                                    f"Found {sel} element, trying the first one")
+                                handle.click(timeout=3000, force=True)  # 强制点击
                                 success = True
                                 result = f"Successfully clicked first {sel} element as fallback (force)"
                                 break
 
                     except Exception as e:
-                        print(f"Fallback strategy failed: {e}")
+                        logger.debug("Fallback strategy failed: %s", e)
 
                 if not success:
                     return f"Error: Could not find and click element"
 
-                # Reduced wait time after click
-                time.sleep(0.5)
+                # Wait for the click's DOM effect (or conclude no change)
+                self._wait_for_dom_change(prev_rev, timeout=2000)
 
             elif action_type == 'type':
                 ref = action.get('ref')
@@ -523,36 +796,34 @@ Determine the next action to take. If the task is complete, use 'finish' action
                 if not ref and not selector:
                     return "Error: No ref or selector specified for type action"
 
-                # Try multiple strategies to find input element
-                success = False
+                if (ref and not selector and self.snapshot.ref_index
+                        and ref not in self.snapshot.ref_index):
+                    return f"Error: ref '{ref}' not present in current snapshot"
 
-                # Strategy 1: Use provided selector
-                if selector and not success:
-                    try:
-                        print(f"Trying to type in selector: {selector}")
-                        element_count = self.page.locator(selector).count()
-                        if element_count > 0:
-                            self.page.fill(selector, text, timeout=5000)
-                            success = True
-                            result = f"Successfully typed '{text}' into selector {selector}"
-                    except Exception as e:
-                        print(f"Selector typing failed: {e}")
+                strategies = []
+                if selector:
+                    strategies.append(selector)
+                if ref:
+                    strategies.append(
+                        self.snapshot.ref_selectors.get(ref)
+                        or ref_selector(ref))
 
-                # Strategy 2: Try aria-ref attribute
-                if ref and not success:
+                success = False
+                for sel in strategies:
+                    retry = sel is strategies[-1] and bool(ref)
+                    handle = self._resolve_element(sel,
+                                                   retry_with_refresh=retry)
+                    if handle is None:
+                        continue
                     try:
-                        aria_selector = f"[aria-ref='{ref}']"
-                        print(f"Trying to type in aria-ref: {aria_selector}")
-                        element_count = self.page.locator(
-                            aria_selector).count()
-                        if element_count > 0:
-                            self.page.fill(aria_selector, text, timeout=5000)
-                            success = True
-                            result = f"Successfully typed '{text}' into element {ref} using aria-ref"
+                        handle.fill(text, timeout=5000)
+                        success = True
+                        result = f"Successfully typed '{text}' into {sel}"
+                        break
                     except Exception as e:
-                        print(f"aria-ref typing failed: {e}")
+                        logger.debug("Typing via %s failed: %s", sel, e)
 
-                # Strategy 3: Try common input selectors as fallback
+                # Fallback: first plausible text-input element
                 if not success:
                     try:
                         input_selectors = [
@@ -562,18 +833,17 @@ Determine the next action to take. If the task is complete, use 'finish' action
                         ]
 
                         for sel in input_selectors:
-                            elements = self.page.locator(sel)
-                            count = elements.count()
-                            if count > 0:
+                            handle = self.page.query_selector(sel)
+                            if handle is not None:
                                 print(
-                                    f"Found {count} {sel} elements, typing into the first one")
-                                elements.first.fill(text, timeout=3000)
+                                    f"Found {sel} element, typing into the first one")
+                                handle.fill(text, timeout=3000)
                                 success = True
                                 result = f"Successfully typed '{text}' into {sel} element"
                                 break
 
                     except Exception as e:
-                        print(f"Input fallback strategy failed: {e}")
+                        logger.debug("Input fallback strategy failed: %s", e)
 
                 if not success:
                     return f"Error: Could not find input element"
@@ -586,12 +856,14 @@ Determine the next action to take. If the task is complete, use 'finish' action
                 if not ref and not selector:
                     return "Error: No ref or selector specified for select action"
 
-                target_selector = selector or f"[aria-ref='{ref}']"
-
                 try:
-                    self.page.wait_for_selector(target_selector, timeout=10000)
-                    self.page.select_option(target_selector, value,
-                                            timeout=10000)
+                    if selector:
+                        handle = self.page.wait_for_selector(selector,
+                                                             timeout=10000)
+                        handle.select_option(value, timeout=10000)
+                    else:
+                        loc = self.snapshot._make_locator(ref)
+                        loc.select_option(value, timeout=10000)
                     result = f"Successfully selected '{value}' in element"
                 except Exception as e:
                     return f"Select operation failed: {e}"
@@ -614,10 +886,9 @@ Determine the next action to take. If the task is complete, use 'finish' action
                 if not ref:
                     return "Error: No ref specified for extract action"
 
-                selector = f"[aria-ref='{ref}']"
-
-                self.page.wait_for_selector(selector, timeout=10000)
-                text = self.page.text_content(selector, timeout=10000)
+                loc = self.snapshot._make_locator(ref)
+                loc.wait_for(timeout=10000)
+                text = loc.text_content()
                 if 'variable' in action:
                     setattr(self, action['variable'], text)
                 result = f"Extracted text: {text[:100] if text else 'None'}..."
@@ -630,7 +901,7 @@ Determine the next action to take. If the task is complete, use 'finish' action
                 else:
                     self.page.evaluate(f"window.scrollBy(0, -{amount})")
                 result = f"Scrolled {direction} by {amount}px"
-                time.sleep(1)  # Wait after scrolling
+                self._wait_for_network_idle(idle_ms=300, timeout=3000)
 
             elif action_type == 'enter':
                 ref = action.get('ref')
@@ -638,14 +909,13 @@ Determine the next action to take. If the task is complete, use 'finish' action
 
                 try:
                     if ref:
-                        focus_selector = f"[aria-ref='{ref}']"
-                        self.page.focus(focus_selector)
+                        self.snapshot._make_locator(ref).focus(timeout=5000)
                     elif selector:
                         self.page.focus(selector)
                     # Press Enter globally (works even if already focused)
                     self.page.keyboard.press("Enter")
                     result = "Pressed Enter key"
-                    time.sleep(0.5)
+                    self._wait_for_network_idle(timeout=5000)
                 except Exception as e:
                     return f"Enter key press failed: {e}"
 
@@ -669,20 +939,9 @@ Determine the next action to take. If the task is complete, use 'finish' action
             print(f"Action execution error: {e}")
             print(f"Full error details:", e)
 
-        # Optimized snapshot update after action
-        try:
-            old_snapshot = self.snapshot.snapshot_data
-            # Use cache if possible, otherwise force refresh
-            updated_snapshot = self.snapshot.capture()
-
-            # Only update if snapshot actually changed
-            if old_snapshot != updated_snapshot:
-                print(
-                    f"Snapshot updated after action. New size: {len(updated_snapshot)} characters")
-            else:
-                print("Snapshot unchanged after action")
-        except Exception as e:
-            print(f"Error updating snapshot after action: {e}")
+        # No snapshot refresh here: the next capture() call is a cache hit
+        # when the action left the DOM revision unchanged, and re-walks only
+        # when something actually mutated.
 
         return result
 
@@ -706,20 +965,23 @@ Determine the next action to take. If the task is complete, use 'finish' action
         try:
             # Clear action history for new command
             self.action_history = []
+            self._next_action_cache.clear()
             
             # 1. Get initial plan
             current_snapshot = self.snapshot.capture()
             if "Error:" in current_snapshot:
                 print("Could not capture initial snapshot")
                 return
-            print_color(current_snapshot,'green')
+            if _VERBOSE:
+                print_color(current_snapshot, 'green')
             self.plan, action = self.get_initial_plan(prompt, current_snapshot)
             print("\nPlan:",
-                  json.dumps(self.plan, indent=2, ensure_ascii=False))
+                  json_dumps(self.plan, indent=True))
 
             # 2. Execute action sequence
             max_actions = 15  # Increase maximum action count
             action_count = 0
+            last_action_sig = None
 
             while action and action_count < max_actions:
                 # Check if this is a finish action
@@ -729,10 +991,26 @@ Determine the next action to take. If the task is complete, use 'finish' action
                         f"Summary: {action.get('summary', 'No summary provided')}")
                     return
 
+                # For actions whose outcome is fully predictable (plain
+                # timed waits), overlap the next-action LLM round trip with
+                # the action itself: the page will not change, so the
+                # request inputs are already known.
+                speculative = None
+                predicted = None
+                if action.get('type') == 'wait' and 'timeout' in action:
+                    predicted = {
+                        'action': action,
+                        'result': f"Waited for {action['timeout']}ms",
+                        'success': True,
+                    }
+                    speculative = self._llm_executor.submit(
+                        self._get_llm_response, prompt, current_snapshot,
+                        self.action_history + [predicted], False)
+
                 # Execute current action
                 result = self.execute_action(action)
                 print(
-                    f"\nExecuted action: {json.dumps(action, indent=2, ensure_ascii=False)}")
+                    f"\nExecuted action: {json_dumps(action, indent=True)}")
                 print(f"Result: {result}")
 
                 # Record action in history
@@ -743,21 +1021,57 @@ Determine the next action to take. If the task is complete, use 'finish' action
                     'success': success
                 })
 
+                # Abort cheaply when the LLM keeps proposing the same
+                # failing action - otherwise a no-effect click burns the
+                # full budget of LLM calls and snapshots.
+                sig = (action.get('type'), action.get('ref'),
+                       action.get('text'))
+                if sig == last_action_sig and "Error" in result:
+                    print("Same action failed twice in a row, "
+                          "stuck in loop - stopping")
+                    break
+                last_action_sig = sig
+
+                if speculative is not None:
+                    if predicted['result'] == result:
+                        response = speculative.result()
+                        next_action = None
+                        if response and isinstance(response, dict):
+                            next_action = self._fix_action_format(
+                                response.get('action'))
+                        if next_action is not None:
+                            print("Using speculative next action "
+                                  "(planned during the wait)")
+                            action = next_action
+                            action_count += 1
+                            continue
+                    else:
+                        speculative.cancel()
+
                 # If action failed, try to get new snapshot
+                llm_snapshot = current_snapshot
                 if "Error" in result:
                     print("Action failed, trying to continue...")
-                    time.sleep(2)
-                    # Force refresh on error
+                    self._wait_for_network_idle(timeout=2000)
+                    # Release the stale YAML before re-capture so the old
+                    # string is collectable during the new DOM walk
+                    self.snapshot.snapshot_data = None
                     current_snapshot = self.snapshot.capture(
                         force_refresh=True)
+                    llm_snapshot = current_snapshot
                 else:
                     # Smart snapshot update - only if action might have changed the page
                     if self._should_update_snapshot(action):
                         print(
                             "Action might have changed page, capturing fresh snapshot...")
                         old_snapshot = current_snapshot
+                        # Drop the retained copy up front: with multi-MB
+                        # snapshots this keeps peak memory at one snapshot
+                        # instead of three (old, retained, new)
+                        self.snapshot.snapshot_data = None
                         current_snapshot = self.snapshot.capture(
                             force_refresh=True)
+                        llm_snapshot = current_snapshot
 
                         # Check if snapshot actually changed
                         if old_snapshot == current_snapshot:
@@ -765,6 +1079,15 @@ Determine the next action to take. If the task is complete, use 'finish' action
                         else:
                             print(
                                 f"Page updated after action. New size: {len(current_snapshot)} characters")
+                            # Ship only the delta: a localized change on a
+                            # large page is a few lines of diff instead of
+                            # the whole tree re-sent as input tokens.
+                            if "Error:" not in old_snapshot \
+                                    and "Error:" not in current_snapshot:
+                                diff = self.snapshot._compute_diff(
+                                    old_snapshot, current_snapshot)
+                                if len(diff) < len(current_snapshot):
+                                    llm_snapshot = diff
                     else:
                         print(
                             f"Action '{action.get('type')}' doesn't change page content, reusing snapshot")
@@ -774,7 +1097,7 @@ Determine the next action to take. If the task is complete, use 'finish' action
                     break
 
                 # Get next action
-                action = self.get_next_action(prompt, current_snapshot)
+                action = self.get_next_action(prompt, llm_snapshot)
                 action_count += 1
 
             if action_count >= max_actions:
@@ -787,6 +1110,11 @@ Determine the next action to take. If the task is complete, use 'finish' action
 
     def close(self) -> None:
         """Clean up resources"""
+        try:
+            self._llm_executor.shutdown(wait=False)
+        except Exception:
+            pass
+
         try:
             self.context.close()
         except Exception:
@@ -3,10 +3,29 @@
     // Preserves complete snapshot.js logic while adding visual coordinate information
 
     let refCounter = 1;
+    // Worst-case budget: pathological DOMs (50k+ nodes, deeply nested
+    // wrappers) otherwise make snapshot latency heavy-tailed. Typical
+    // pages sit far below both limits and are unaffected.
+    const MAX_DEPTH = 25;
+    const MAX_REFS = 1500;
     function generateRef() {
         return `e${refCounter++}`;
     }
 
+    // Computed styles are requested for the same element up to four times
+    // per pass (visibility check, traversal prune, pointer-events walk,
+    // cursor check), each one a potential forced style recalc. Memoize
+    // per pass; the cache is cleared alongside textCache.
+    const styleCache = new Map();
+    function getStyle(element) {
+        let style = styleCache.get(element);
+        if (style === undefined) {
+            style = window.getComputedStyle(element);
+            styleCache.set(element, style);
+        }
+        return style;
+    }
+
     // === Complete snapshot.js logic preservation ===
 
     function isVisible(node) {
@@ -15,7 +34,7 @@
         if (node.nodeType !== Node.ELEMENT_NODE) return true;
 
         try {
-        const style = window.getComputedStyle(node);
+        const style = getStyle(node);
             if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0')
                 return false;
             // An element with `display: contents` is not rendered itself, but its children are.
@@ -29,6 +48,19 @@
         }
     }
 
+    // Hoisted lookup tables: the old per-call array literals were
+    // re-allocated and scanned with Array.includes for every element.
+    const INPUT_BUTTON_TYPES = new Set(['button', 'checkbox', 'radio', 'reset', 'submit']);
+    const HEADING_TAGS = new Set(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']);
+    // Extended role mapping to better match Playwright
+    const ROLE_BY_TAG = {
+        a: 'link', button: 'button', select: 'select', textarea: 'textarea',
+        img: 'img', main: 'main', nav: 'navigation',
+        ul: 'list', ol: 'list', li: 'listitem', em: 'emphasis',
+        section: 'region', article: 'region', aside: 'complementary',
+        header: 'banner', footer: 'contentinfo', fieldset: 'group'
+    };
+
     function getRole(node) {
         // Check if node is null or doesn't have required properties
         if (!node || !node.tagName || !node.getAttribute) {
@@ -40,32 +72,13 @@
 
         const tagName = node.tagName.toLowerCase();
 
-        // Extended role mapping to better match Playwright
-        if (tagName === 'a') return 'link';
-        if (tagName === 'button') return 'button';
         if (tagName === 'input') {
             const type = node.getAttribute('type')?.toLowerCase();
-            if (['button', 'checkbox', 'radio', 'reset', 'submit'].includes(type)) return type;
-            return 'textbox';
+            return INPUT_BUTTON_TYPES.has(type) ? type : 'textbox';
         }
-        if (['select', 'textarea'].includes(tagName)) return tagName;
-        if (['h1', 'h2', 'h3', 'h4', 'h5', 'h6'].includes(tagName)) return 'heading';
-
-        // Additional roles for better Playwright compatibility
-        if (tagName === 'img') return 'img';
-        if (tagName === 'main') return 'main';
-        if (tagName === 'nav') return 'navigation';
-        if (tagName === 'ul' || tagName === 'ol') return 'list';
-        if (tagName === 'li') return 'listitem';
-        if (tagName === 'em') return 'emphasis';
-        if (tagName === 'form' && node.getAttribute('role') === 'search') return 'search';
-        if (tagName === 'section' || tagName === 'article') return 'region';
-        if (tagName === 'aside') return 'complementary';
-        if (tagName === 'header') return 'banner';
-        if (tagName === 'footer') return 'contentinfo';
-        if (tagName === 'fieldset') return 'group';
-
-        return 'generic';
+        if (HEADING_TAGS.has(tagName)) return 'heading';
+
+        return ROLE_BY_TAG[tagName] || 'generic';
     }
 
     // Playwright-inspired function to check if element receives pointer events
@@ -75,7 +88,7 @@
         try {
             let e = element;
             while (e) {
-                const style = window.getComputedStyle(e);
+                const style = getStyle(e);
                 if (!style) break;
 
                 const pointerEvents = style.pointerEvents;
@@ -95,13 +108,15 @@
         if (!element || !element.nodeType || element.nodeType !== Node.ELEMENT_NODE) return false;
 
         try {
-            const style = window.getComputedStyle(element);
+            const style = getStyle(element);
             return style.cursor === 'pointer';
         } catch (error) {
             return false;
         }
     }
 
+    const kAriaLevelRoles = new Set(['heading', 'listitem', 'row', 'treeitem']);
+
     // Playwright-inspired function to get aria level
     function getAriaLevel(element) {
         if (!element || !element.tagName) return 0;
@@ -113,8 +128,7 @@
 
         // Check aria-level attribute for roles that support it
         const role = getRole(element);
-        const kAriaLevelRoles = ['heading', 'listitem', 'row', 'treeitem'];
-        if (kAriaLevelRoles.includes(role)) {
+        if (kAriaLevelRoles.has(role)) {
             const ariaLevel = element.getAttribute('aria-level');
             if (ariaLevel !== null) {
                 const value = Number(ariaLevel);
@@ -145,6 +159,10 @@
         return text;
         }
 
+    const NON_TEXT_TAGS = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'META', 'HEAD']);
+    const SKIP_TAGS = new Set(['script', 'style', 'meta', 'noscript']);
+    const IGNORED_ROLES = new Set(['presentation', 'none']);
+
     const textCache = new Map();
     function getVisibleTextContent(_node) {
         // Check if node is null or doesn't have nodeType
@@ -158,7 +176,7 @@
             return _node.nodeValue || '';
         }
 
-        if (_node.nodeType !== Node.ELEMENT_NODE || !isVisible(_node) || ['SCRIPT', 'STYLE', 'NOSCRIPT', 'META', 'HEAD'].includes(_node.tagName)) {
+        if (_node.nodeType !== Node.ELEMENT_NODE || !isVisible(_node) || NON_TEXT_TAGS.has(_node.tagName)) {
             return '';
         }
 
@@ -188,7 +206,7 @@
 
             const role = getRole(element);
             // 'presentation' and 'none' roles are ignored, but their children are processed.
-            if (['presentation', 'none'].includes(role)) return null;
+            if (IGNORED_ROLES.has(role)) return null;
 
             const name = getAccessibleName(element);
 
@@ -234,18 +252,20 @@
             return node;
         }
 
-        function traverse(element, parentNode) {
+        function traverse(element, parentNode, depth = 0) {
             // Check if element is null or not a valid DOM element
             if (!element || !element.tagName || visited.has(element)) return;
+            // Budget guards: cap recursion depth and total tagged refs.
+            if (depth > MAX_DEPTH || refCounter > MAX_REFS) return;
             visited.add(element);
 
             // FIX: Completely skip script and style tags and their children.
             const tagName = element.tagName.toLowerCase();
-            if (['script', 'style', 'meta', 'noscript'].includes(tagName))
+            if (SKIP_TAGS.has(tagName))
                 return;
 
             // Check if element is explicitly hidden by CSS - if so, skip entirely including children
-            const style = window.getComputedStyle(element);
+            const style = getStyle(element);
             if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0') {
                 return;
             }
@@ -258,7 +278,7 @@
 
             for (const child of element.childNodes) {
                 if (child.nodeType === Node.ELEMENT_NODE) {
-                    traverse(child, newParent);
+                    traverse(child, newParent, depth + 1);
                 } else if (child.nodeType === Node.TEXT_NODE) {
                     const text = (child.textContent || '').trim();
                     if (text) newParent.children.push(text);
@@ -269,7 +289,7 @@
             if (element.shadowRoot) {
                 for (const child of element.shadowRoot.childNodes) {
                     if (child.nodeType === Node.ELEMENT_NODE) {
-                        traverse(child, newParent);
+                        traverse(child, newParent, depth + 1);
                     } else if (child.nodeType === Node.TEXT_NODE) {
                         const text = (child.textContent || '').trim();
                         if (text) newParent.children.push(text);
@@ -444,8 +464,9 @@
     function processDocument(doc) {
         if (!doc.body) return [];
 
-        // Clear cache for each new document processing.
+        // Clear caches for each new document processing.
         textCache.clear();
+        styleCache.clear();
         let tree = buildAriaTree(doc.body);
         [tree] = normalizeTree(tree);
 
@@ -483,8 +504,18 @@
         let rects = element.getClientRects();
         let scale = window.devicePixelRatio || 1;
         let validRects = [];
+        const vw = window.innerWidth;
+        const vh = window.innerHeight;
 
         for (const rect of rects) {
+            // Every isTopmost probe forces a hit test, and off-viewport
+            // rects can never be click targets anyway - skip them before
+            // paying for elementFromPoint. Bounds the per-snapshot hit
+            // testing by the viewport instead of the page length.
+            if (rect.bottom < 0 || rect.top > vh ||
+                rect.right < 0 || rect.left > vw) {
+                continue;
+            }
             let x = rect.left + rect.width / 2;
             let y = rect.top + rect.height / 2;
             if (isTopmost(element, x, y)) {
@@ -513,30 +544,34 @@
             // Get visual coordinates for this element
             const coordinates = getElementCoordinates(node.element);
 
-            // Store comprehensive element information
-            elementsMap[node.ref] = {
+            // Store element information, omitting empty fields: CDP
+            // serializes every key it is given, and null-padded entries
+            // roughly double the payload on dense pages.
+            const entry = {
                 // Structural information (preserved from snapshot.js)
                 role: node.role,
                 name: node.name,
-                tagName: node.element.tagName.toLowerCase(),
-                disabled: node.disabled,
-                checked: node.checked,
-                expanded: node.expanded,
-                level: node.level,
-
-                // Visual information (from page_script.js)
-                coordinates: coordinates,
-
-                // Additional metadata
-                href: node.element.href || null,
-                value: node.element.value || null,
-                placeholder: node.element.placeholder || null,
-                scrollable: node.element.scrollHeight > node.element.clientHeight,
-
-                // Playwright-inspired properties
-                receivesPointerEvents: receivesPointerEvents(node.element),
-                hasPointerCursor: hasPointerCursor(node.element)
+                tagName: node.element.tagName.toLowerCase()
             };
+            if (node.disabled !== undefined) entry.disabled = node.disabled;
+            if (node.checked !== undefined) entry.checked = node.checked;
+            if (node.expanded !== undefined) entry.expanded = node.expanded;
+            if (node.level !== undefined) entry.level = node.level;
+
+            // Visual information (from page_script.js)
+            if (coordinates.length) entry.coordinates = coordinates;
+
+            // Additional metadata
+            if (node.element.href) entry.href = node.element.href;
+            if (node.element.value) entry.value = node.element.value;
+            if (node.element.placeholder) entry.placeholder = node.element.placeholder;
+            if (node.element.scrollHeight > node.element.clientHeight) entry.scrollable = true;
+
+            // Playwright-inspired properties (only flag the exceptions)
+            if (!receivesPointerEvents(node.element)) entry.receivesPointerEvents = false;
+            if (hasPointerCursor(node.element)) entry.hasPointerCursor = true;
+
+            elementsMap[node.ref] = entry;
         }
 
         // Recursively process children
@@ -548,18 +583,34 @@
     }
 
     function analyzePageElements() {
-        // Generate the complete structured snapshot using original snapshot.js logic
-        const outputLines = processDocument(document);
-        const snapshotText = outputLines.join('\n');
-
-        // Build the tree again to collect element information with visual data
+        // One traversal serves both outputs: the rendered snapshot text
+        // and the element map. The tree used to be built twice (once in
+        // processDocument, once more for collection), doubling every
+        // style read, layout query and text walk per capture.
         textCache.clear();
-        refCounter = 1; // Reset counter to match snapshot generation
-        let tree = buildAriaTree(document.body);
-        [tree] = normalizeTree(tree);
+        styleCache.clear();
+        let tree = null;
+        const lines = [];
+        if (document.body) {
+            tree = buildAriaTree(document.body);
+            [tree] = normalizeTree(tree);
+            lines.push(...renderTree(tree).slice(1)); // Skip the root node line
+
+            const frames = document.querySelectorAll('iframe');
+            for (const frame of frames) {
+                try {
+                    if (frame.contentDocument) {
+                        lines.push(...processDocument(frame.contentDocument));
+                    }
+                } catch (e) {
+                    // Skip cross-origin iframes
+                }
+            }
+        }
+        const snapshotText = lines.join('\n');
 
         const elementsMap = {};
-        collectElementsFromTree(tree, elementsMap);
+        if (tree) collectElementsFromTree(tree, elementsMap);
 
         const result = {
             url: window.location.href,
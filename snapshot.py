@@ -1,25 +1,135 @@
 from pathlib import Path
+import atexit
+import difflib
+import re
 import time
 import os
 import subprocess
 import json
+from functools import lru_cache
 from typing import Optional, Dict, List
 
+# Cheap DOM-change fingerprint: a MutationObserver bumps window.__domRev on
+# every mutation (plus history navigation), so Python can tell "page
+# unchanged" with one evaluate instead of a full snapshot walk.
+_DOM_REV_JS = """
+(() => {
+  if (window.__domRevMonitor) return;
+  window.__domRevMonitor = true;
+  window.__domRev = 0;
+  const bump = () => { window.__domRev++; };
+  const install = () => {
+    new MutationObserver(bump).observe(document.documentElement, {
+      childList: true, subtree: true, attributes: true, characterData: true,
+    });
+  };
+  if (document.documentElement) install();
+  else document.addEventListener('DOMContentLoaded', install, { once: true });
+  window.addEventListener('popstate', bump);
+  window.addEventListener('hashchange', bump);
+})();
+"""
+
+# Installed once per document so the fallback capture ships a function
+# *name* over CDP instead of the whole script body on every call.
+_FALLBACK_SNAP_JS = """
+window.__fallbackSnap = () => {
+  const b = document.body;
+  return b ? (b.textContent || '').trim().slice(0, 500) : '';
+};
+"""
+
+
+# Shared snapshot_helper.js worker process. Spawning node per snapshot
+# pays interpreter startup plus a fresh Playwright browser launch every
+# call; the worker keeps one browser open and answers newline-delimited
+# JSON requests on stdio, so repeat snapshots cost one round-trip.
+_node_worker: Optional[subprocess.Popen] = None
+
+
+def _get_node_worker() -> Optional[subprocess.Popen]:
+    """Return the long-lived snapshot worker, starting it on demand."""
+    global _node_worker
+    if _node_worker is not None and _node_worker.poll() is None:
+        return _node_worker
+    script_path = os.path.join(os.getcwd(), 'snapshot_helper.js')
+    if not os.path.exists(script_path):
+        return None
+
+    env = os.environ.copy()
+    env['PYTHONIOENCODING'] = 'utf-8'
+    if os.name == 'nt':  # Windows
+        env['CHCP'] = '65001'  # Set code page to UTF-8
+
+    try:
+        _node_worker = subprocess.Popen(
+            ['node', 'snapshot_helper.js', '--server'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            encoding='utf-8',
+            errors='replace',
+            env=env,
+        )
+    except (FileNotFoundError, OSError):
+        _node_worker = None
+    return _node_worker
+
+
+def _stop_node_worker() -> None:
+    """Kill the snapshot worker (atexit, or after a broken exchange)."""
+    global _node_worker
+    if _node_worker is not None:
+        try:
+            _node_worker.kill()
+        except OSError:
+            pass
+        _node_worker = None
+
+
+atexit.register(_stop_node_worker)
+
+
+@lru_cache(maxsize=256)
+def ref_selector(ref: str) -> str:
+    """Attribute selector for a snapshot ref.
+
+    The ref comes back from the LLM, so it is quoted via json.dumps -
+    a malformed value cannot break out of the selector - and memoized so
+    repeated actions on the same ref reuse one string.
+    """
+    return f"[aria-ref={json.dumps(ref)}]"
+
+
 class PageSnapshot:
+    _REF_RE = re.compile(r"\[ref=(e\d+)\]")
+    _QUOTED_RE = re.compile(r'"([^"]+)"')  # accessible name on a snapshot line
+
     def __init__(self, page):
         self.page = page
         self.snapshot_data = None  # Last full snapshot (formatted string)
         self.element_map = {}  # Store mapping from ref to actual elements
-        # Note: Cache fields for URL/content-based optimisations were removed to
-        # ensure we always take a fresh snapshot. We keep only `snapshot_data`
-        # so that diff generation can compare against the previous full
-        # snapshot captured during the same session.
+        self.ref_selectors: Dict[str, str] = {}  # ref -> precomputed selector
+        self.ref_index: Dict[str, str] = {}  # ref -> its snapshot line
+        self.ref_to_text: Dict[str, str] = {}  # ref -> accessible name
+        # Snapshots are cached keyed on (__domRev, url); any DOM mutation
+        # invalidates the key, so a hit is a safe reuse. `snapshot_data`
+        # additionally feeds diff generation.
+        self._last_key = None
         self._last_direct_error: Optional[str] = None  # Store last error from direct snapshot
+        try:
+            for script in (_DOM_REV_JS, _FALLBACK_SNAP_JS,
+                           self._install_snapshot_js()):
+                result = self.page.add_init_script(script)
+                if hasattr(result, "close"):
+                    result.close()  # async page: the agent registers these
+        except Exception:
+            pass
 
     def _compute_diff(self, old: str, new: str) -> str:
         """Return unified diff between two snapshot strings."""
-        import difflib
-
         old_lines = old.splitlines(keepends=False)
         new_lines = new.splitlines(keepends=False)
 
@@ -40,7 +150,7 @@ class PageSnapshot:
         return "\n".join(diff_block)
 
     def capture(self, force_refresh: bool = False, diff_only: bool = False,
-                include_all: bool = False) -> str:
+                include_all: bool = False, mode: str = "full") -> str:
         """Return the current snapshot.
 
 
@@ -52,15 +162,21 @@ class PageSnapshot:
          If True *and* a previous snapshot exists, return a unified-diff of
          changes instead of the full YAML. Always returns full snapshot on
          first call or when cache is invalid.
+     mode : {"full", "refs_only"}, default "full"
+         "refs_only" strips the snapshot down to lines carrying a
+         [ref=...] marker – the interactable elements – which is usually
+         all the LLM needs and is a fraction of the tokens.
      """
         try:
-            # Always capture a fresh snapshot – caching logic was removed.
             current_url = self.page.url  # still used for logging/debug only
 
-            # Short-circuit: unchanged page & caller **not** forcing diff
-            # if not force_refresh and current_url == self._last_url and self.snapshot_data and not diff_only:
-            #     print("Using cached snapshot (same URL)")
-            #     return self.snapshot_data
+            # Short-circuit: DOM fingerprint unchanged since last capture
+            if not force_refresh and not diff_only and self.snapshot_data:
+                if self._dom_key() == self._last_key is not None:
+                    print("Using cached snapshot (DOM unchanged)")
+                    if mode == "refs_only":
+                        return self._refs_only_view(self.snapshot_data)
+                    return self.snapshot_data
 
             # Fast page stability check (reduced waiting)
             start_time = time.time()
@@ -74,15 +190,19 @@ class PageSnapshot:
             if snapshot_text:
                 print(
                     f"✅ Direct Python _snapshotForAI: {time.time() - start_time:.2f}s")
-                formatted_snapshot = self._format_snapshot(snapshot_text)
+                # Already formatted (header + fences) on the JS side
+                formatted_snapshot = snapshot_text
                 # Compute diff if requested
                 output_snapshot = formatted_snapshot
                 if diff_only and self.snapshot_data:
                     output_snapshot = self._compute_diff(self.snapshot_data, formatted_snapshot)  # type: ignore[attr-defined]
+                elif mode == "refs_only":
+                    output_snapshot = self._refs_only_view(formatted_snapshot)
 
-                # Persist the latest *full* snapshot only for diff generation
-                # (no URL/content hash caching is kept).
                 self._update_cache(current_url, formatted_snapshot)
+                # Key on the revision *after* the walk (ref tagging itself
+                # mutates the DOM and bumps the counter).
+                self._last_key = self._dom_key()
                 return output_snapshot
 
             # Fallback to Node.js version (slower but more reliable)
@@ -101,6 +221,17 @@ class PageSnapshot:
             #     self._update_cache(current_url, formatted_snapshot)
             #     return output_snapshot
 
+            # Fallback: the browser's precomputed AX tree over CDP.
+            # Read-only (no refs), but far richer than body text.
+            start_time = time.time()
+            snapshot_text = self._get_snapshot_cdp()
+            if snapshot_text:
+                print(
+                    f"✅ CDP Accessibility.getFullAXTree: {time.time() - start_time:.2f}s")
+                if diff_only and self.snapshot_data:
+                    return self._compute_diff(self.snapshot_data, snapshot_text)
+                return snapshot_text
+
             # Final fallback
             print("Warning: All snapshot methods failed, using basic fallback")
             fallback = self._fallback_snapshot()
@@ -112,24 +243,139 @@ class PageSnapshot:
             print(f"Error capturing snapshot: {e}")
             return "Error: Could not capture page snapshot"
 
+    # Wrapped snapshot scripts cached per (filename, format): the JS side
+    # appends the "- Page Snapshot" header and fences itself, so Python
+    # receives one final string with no re-concatenation copy. The "json"
+    # format emits a compact {ref: [role, name]} map - far fewer tokens
+    # than the indented YAML and parseable in microseconds.
+    _wrapped_js_cache: Dict[tuple, str] = {}
+
+    # "yaml" (default) keeps the indented tree; "json" sends the compact map.
+    snapshot_format = "yaml"
+
+    # Init-script payload installing the walker once per document as
+    # window.__a11ySnap(fmt): captures then cost a ~40-byte call
+    # expression over CDP instead of reshipping (and recompiling) the
+    # whole walker source every time.
+    _install_js_cache: Dict[str, str] = {}
+
+    @classmethod
+    def _install_snapshot_js(cls, js_filename: str = "snapshot.js") -> str:
+        script = cls._install_js_cache.get(js_filename)
+        if script is None:
+            js_code = (Path(__file__).parent / js_filename).read_text(
+                encoding="utf-8").rstrip().rstrip(';')
+            script = (
+                "window.__a11ySnap = (fmt) => {\n"
+                "  const r = " + js_code + ";\n"
+                "  if (fmt === 'json' && r && r.elements) {\n"
+                "    const compact = {};\n"
+                "    for (const [ref, el] of Object.entries(r.elements)) {\n"
+                "      const entry = [el.role || el.tagName || '', el.name || ''];\n"
+                "      if (el.value) entry.push({value: el.value});\n"
+                "      else if (el.placeholder) entry.push({placeholder: el.placeholder});\n"
+                "      compact[ref] = entry;\n"
+                "    }\n"
+                "    return '- Page Snapshot (json)\\n```json\\n'\n"
+                "      + JSON.stringify({url: r.url, elements: compact})\n"
+                "      + '\\n```';\n"
+                "  }\n"
+                "  const y = r && r.snapshotText !== undefined ? r.snapshotText : r;\n"
+                "  return y ? '- Page Snapshot\\n```yaml\\n' + y + '\\n```' : null;\n"
+                "};"
+            )
+            cls._install_js_cache[js_filename] = script
+        return script
+
+    @classmethod
+    def _load_snapshot_js(cls, js_filename: str, fmt: str = "yaml") -> str:
+        wrapped = cls._wrapped_js_cache.get((js_filename, fmt))
+        if wrapped is None:
+            js_code = (Path(__file__).parent / js_filename).read_text(
+                encoding="utf-8").rstrip().rstrip(';')
+            if fmt == "json":
+                tail = (
+                    "  if (r && r.elements) {\n"
+                    "    const compact = {};\n"
+                    "    for (const [ref, el] of Object.entries(r.elements)) {\n"
+                    "      const entry = [el.role || el.tagName || '', el.name || ''];\n"
+                    "      if (el.value) entry.push({value: el.value});\n"
+                    "      else if (el.placeholder) entry.push({placeholder: el.placeholder});\n"
+                    "      compact[ref] = entry;\n"
+                    "    }\n"
+                    "    return '- Page Snapshot (json)\\n```json\\n'\n"
+                    "      + JSON.stringify({url: r.url, elements: compact})\n"
+                    "      + '\\n```';\n"
+                    "  }\n"
+                )
+            else:
+                tail = ""
+            wrapped = (
+                "(() => {\n"
+                "  const r = " + js_code + ";\n"
+                + tail +
+                "  const y = r && r.snapshotText !== undefined ? r.snapshotText : r;\n"
+                "  return y ? '- Page Snapshot\\n```yaml\\n' + y + '\\n```' : null;\n"
+                "})()"
+            )
+            cls._wrapped_js_cache[(js_filename, fmt)] = wrapped
+        return wrapped
+
     def _get_snapshot_direct(self, all_elements: bool = False) -> Optional[str]:
-        """Try to get snapshot directly using page.evaluate (fastest method)"""
+        """Capture the snapshot via page.evaluate, formatted on the JS side."""
         # Choose appropriate JS snapshot implementation
         js_filename = "snapshot_complete.js" if all_elements else "snapshot.js"
-        js_path = Path(__file__).parent / js_filename
 
         try:
-            js_code = js_path.read_text(encoding="utf-8")
-
-            result = self.page.evaluate(js_code)
-
-            return result
+            if not all_elements:
+                # Pre-installed walker: tiny CDP message, compiled once.
+                result = self.page.evaluate(
+                    "(fmt) => window.__a11ySnap ? window.__a11ySnap(fmt)"
+                    " : '__no_fn__'", self.snapshot_format)
+                if result != '__no_fn__':
+                    return result
+                # Document predates the init script: install the walker
+                # as a function now, so this capture *and* every later
+                # one on the same document hit V8's compiled fast path.
+                self.page.evaluate(self._install_snapshot_js())
+                return self.page.evaluate(
+                    "(fmt) => window.__a11ySnap(fmt)", self.snapshot_format)
+            # Complete-tree variant: ship the full source.
+            return self.page.evaluate(
+                self._load_snapshot_js(js_filename, self.snapshot_format))
         except Exception as e:
             err_msg = str(e)
             self._last_direct_error = err_msg
             print(f"Error evaluating {js_filename}: {err_msg}")
             return None
 
+    def _dom_key(self):
+        """Return the (mutation revision, url) fingerprint, or None."""
+        try:
+            rev = self.page.evaluate(
+                "() => window.__domRev === undefined ? null : window.__domRev")
+            if rev is None:
+                # Document predates the init script (e.g. the snapshot was
+                # attached to an already-open page): install the monitor
+                # late so subsequent captures can still short-circuit.
+                self.page.evaluate(_DOM_REV_JS)
+                rev = self.page.evaluate(
+                    "() => window.__domRev === undefined ? null : window.__domRev")
+        except Exception:
+            return None
+        if rev is None:
+            return None
+        return (rev, self.page.url)
+
+    @staticmethod
+    def _refs_only_view(formatted_snapshot: str) -> str:
+        """Element-only view: keep just the lines that carry a ref."""
+        kept = [line for line in formatted_snapshot.splitlines()
+                if "[ref=" in line]
+        return '\n'.join(
+            ["- Page Snapshot (interactable elements only)", "```yaml"]
+            + kept + ["```"])
+
     def _format_snapshot(self, snapshot_text: str) -> str:
         """Format snapshot text consistently"""
         formatted_snapshot = [
@@ -142,70 +388,153 @@ class PageSnapshot:
 
     def _update_cache(self, url: str, snapshot: str):
         """Update cache with new snapshot data"""
+        # Dedup: a re-walk of an unchanged page reproduces the identical
+        # string (refs are assigned in traversal order), so the parsed
+        # tables and cached locators are still valid - skip the rebuild.
+        if snapshot == self.snapshot_data:
+            return
         # Update stored snapshot so that future `diff_only=True` calls can
-        # compute differences. All other cache mechanisms were removed.
+        # compute differences.
         self.snapshot_data = snapshot
+        # Refs are re-tagged on every walk, so cached locators are stale.
+        self.element_map.clear()
+        # One pass over the text indexes every ref: the selector dict
+        # doubles as a pure-Python "does this ref exist" check, ref_index
+        # keeps each ref's line, and ref_to_text holds the quoted
+        # accessible name so the click-by-text fallback is a dict lookup
+        # instead of a regex search on the hot action path.
+        self.ref_selectors = {}
+        self.ref_index = {}
+        self.ref_to_text = {}
+        for line in snapshot.splitlines():
+            refs = self._REF_RE.findall(line)
+            if not refs:
+                continue
+            name_match = self._QUOTED_RE.search(line)
+            for ref in refs:
+                self.ref_selectors[ref] = ref_selector(ref)
+                self.ref_index[ref] = line.strip()
+                if name_match:
+                    self.ref_to_text[ref] = name_match.group(1)
+
+    def _make_locator(self, ref: str):
+        """Return a Locator for an aria-ref, cached per snapshot.
+
+        Reusing the Locator skips re-parsing the selector on every action
+        branch that touches the same ref; the cache lives in `element_map`
+        and is invalidated together with the snapshot.
+        """
+        loc = self.element_map.get(ref)
+        if loc is None:
+            loc = self.page.locator(ref_selector(ref))
+            self.element_map[ref] = loc
+        return loc
 
     def _get_snapshot_via_nodejs(self) -> Optional[str]:
-        """Try to get snapshot using Node.js version of Playwright"""
-        try:
-            # Get current page URL
-            current_url = self.page.url
-
-            # Check if snapshot_helper.js exists
-            script_path = os.path.join(os.getcwd(), 'snapshot_helper.js')
-            if not os.path.exists(script_path):
-                print("snapshot_helper.js not found, skipping Node.js method")
+        """Try to get snapshot using Node.js version of Playwright.
+
+        Goes through the shared --server worker, so only the first call
+        pays node + browser startup. The worker's own navigation timeouts
+        bound each request; a dead worker is restarted and retried once.
+        """
+        current_url = self.page.url
+
+        for _ in range(2):
+            proc = _get_node_worker()
+            if proc is None:
+                print("snapshot_helper.js worker unavailable, "
+                      "skipping Node.js method")
                 return None
 
-            # Set environment to ensure UTF-8 encoding
-            env = os.environ.copy()
-            env['PYTHONIOENCODING'] = 'utf-8'
-            if os.name == 'nt':  # Windows
-                env['CHCP'] = '65001'  # Set code page to UTF-8
-
-            # Call Node.js script with reduced timeout
-            cmd = ['node', 'snapshot_helper.js', 'snapshot', current_url]
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=10,  # Reduced from 30s to 10s
-                encoding='utf-8',
-                errors='replace',
-                env=env
-            )
-
-            if result.returncode == 0:
-                # Parse JSON response
-                response_data = json.loads(result.stdout.strip())
-                if response_data.get('success'):
-                    print(
-                        "🚀 Using Node.js page._snapshotForAI() (official method)")
-                    return response_data.get('snapshot')
-                else:
-                    print(
-                        f"Node.js snapshot failed: {response_data.get('error')}")
-                    return None
-            else:
-                print(
-                    f"Node.js script failed with return code {result.returncode}")
-                if result.stderr:
-                    print(f"Error output: {result.stderr}")
+            try:
+                proc.stdin.write(
+                    json.dumps({'cmd': 'snapshot', 'url': current_url}) + '\n')
+                proc.stdin.flush()
+                line = proc.stdout.readline()
+            except (OSError, ValueError):
+                line = ''
+
+            if not line:
+                # Worker died mid-exchange; restart it and retry once.
+                _stop_node_worker()
+                continue
+
+            try:
+                response_data = json.loads(line)
+            except json.JSONDecodeError:
+                print("Failed to parse Node.js response")
+                _stop_node_worker()
                 return None
 
-        except subprocess.TimeoutExpired:
-            print("Node.js snapshot timeout")
-            return None
-        except FileNotFoundError:
-            print("Node.js not found in PATH")
+            if response_data.get('success'):
+                print(
+                    "🚀 Using Node.js page._snapshotForAI() (official method)")
+                return response_data.get('snapshot')
+            print(f"Node.js snapshot failed: {response_data.get('error')}")
             return None
-        except json.JSONDecodeError:
-            print("Failed to parse Node.js response")
+
+        print("Node.js snapshot worker not responding")
+        return None
+
+    @staticmethod
+    def _format_ax_nodes(nodes: List[dict]) -> Optional[str]:
+        """Render Accessibility.getFullAXTree nodes as snapshot-style YAML.
+
+        Indentation follows the parentId links; ignored and purely
+        structural nodes are dropped. The output carries no [ref=...]
+        markers - CDP node ids cannot be turned into aria-ref attributes
+        - so callers must treat it as read-only.
+        """
+        by_id = {n['nodeId']: n for n in nodes if 'nodeId' in n}
+        depth_cache: Dict[str, int] = {}
+
+        def depth(node_id: str) -> int:
+            d = depth_cache.get(node_id)
+            if d is None:
+                parent = by_id.get(node_id, {}).get('parentId')
+                d = depth(parent) + 1 if parent in by_id else 0
+                depth_cache[node_id] = d
+            return d
+
+        lines = []
+        for node in nodes:
+            if node.get('ignored') or 'nodeId' not in node:
+                continue
+            role = (node.get('role') or {}).get('value', '')
+            if not role or role in ('none', 'generic', 'InlineTextBox'):
+                continue
+            name = ((node.get('name') or {}).get('value') or '').strip()
+            indent = '  ' * depth(node['nodeId'])
+            lines.append(
+                f'{indent}- {role} "{name}"' if name else f'{indent}- {role}')
+
+        if not lines:
             return None
+        return '\n'.join(["- Page Snapshot", "```yaml"] + lines + ["```"])
+
+    def _get_cdp_session(self):
+        """CDP session for this page, created once and reused."""
+        session = getattr(self, '_cdp_session', None)
+        if session is None:
+            session = self.page.context.new_cdp_session(self.page)
+            self._cdp_session = session
+        return session
+
+    def _get_snapshot_cdp(self) -> Optional[str]:
+        """Snapshot from the browser's own accessibility tree over CDP.
+
+        One protocol message returns roles/names the browser already
+        computed - no JS walk, no style recalc. Used when the tagged
+        walker fails: richer than the body-text fallback, but read-only
+        because the nodes carry no aria-ref attributes for actions.
+        """
+        try:
+            tree = self._get_cdp_session().send('Accessibility.getFullAXTree')
         except Exception as e:
-            print(f"Error calling Node.js snapshot: {e}")
+            print(f"CDP snapshot failed: {e}")
+            self._cdp_session = None  # session may be stale; recreate next time
             return None
+        return self._format_ax_nodes(tree.get('nodes') or [])
 
     def _fallback_snapshot(self) -> str:
         """Fallback method when _snapshotForAI is not available"""
@@ -214,15 +543,159 @@ class PageSnapshot:
             title = self.page.title()
             url = self.page.url
 
-            # Get basic text content from body
-            body_text = self.page.evaluate("""() => {
-                const body = document.body;
-                if (!body) return '';
+            # Call the pre-installed global; inline body for documents
+            # that were loaded before the init script existed.
+            body_text = self.page.evaluate(
+                "() => window.__fallbackSnap ? window.__fallbackSnap() : "
+                "(document.body ? (document.body.textContent || '')"
+                ".trim().slice(0, 500) : '')")
+
+            fallback_snapshot = [
+                "- Page Snapshot",
+                "```yaml",
+                f"- generic [ref=e1]: {body_text}" if body_text else "- generic [ref=e1]: (no content)",
+                "```"
+            ]
+
+            return '\n'.join(fallback_snapshot)
+
+        except Exception as e:
+            print(f"Error in fallback snapshot: {e}")
+            return "Error: Could not capture page snapshot"
+
+
+class AsyncPageSnapshot(PageSnapshot):
+    """PageSnapshot variant driving a `playwright.async_api` Page.
+
+    Reuses the formatting/diff helpers from the sync class; only the
+    methods that actually talk to the page are overridden as coroutines.
+    """
 
-                // Get visible text content, but limit length
-                const text = body.textContent || '';
-                return text.trim().slice(0, 500);
-            }""")
+    async def _dom_key(self):
+        """Async counterpart of `PageSnapshot._dom_key`."""
+        try:
+            rev = await self.page.evaluate(
+                "() => window.__domRev === undefined ? null : window.__domRev")
+            if rev is None:
+                # Late install, mirroring the sync variant.
+                await self.page.evaluate(_DOM_REV_JS)
+                rev = await self.page.evaluate(
+                    "() => window.__domRev === undefined ? null : window.__domRev")
+        except Exception:
+            return None
+        if rev is None:
+            return None
+        return (rev, self.page.url)
+
+    async def capture(self, force_refresh: bool = False, diff_only: bool = False,
+                      include_all: bool = False, mode: str = "full") -> str:
+        """Async counterpart of `PageSnapshot.capture`."""
+        try:
+            current_url = self.page.url  # still used for logging/debug only
+
+            if not force_refresh and not diff_only and self.snapshot_data:
+                key = await self._dom_key()
+                if key is not None and key == self._last_key:
+                    print("Using cached snapshot (DOM unchanged)")
+                    if mode == "refs_only":
+                        return self._refs_only_view(self.snapshot_data)
+                    return self.snapshot_data
+
+            # Fast page stability check (reduced waiting)
+            start_time = time.time()
+            await self.page.wait_for_load_state('domcontentloaded', timeout=5000)
+            print(f"Page load check: {time.time() - start_time:.2f}s")
+
+            # Try direct evaluation first (fastest method)
+            start_time = time.time()
+            snapshot_text = await self._get_snapshot_direct(all_elements=include_all)
+
+            if snapshot_text:
+                print(
+                    f"✅ Direct Python _snapshotForAI: {time.time() - start_time:.2f}s")
+                # Already formatted (header + fences) on the JS side
+                formatted_snapshot = snapshot_text
+                # Compute diff if requested
+                output_snapshot = formatted_snapshot
+                if diff_only and self.snapshot_data:
+                    output_snapshot = self._compute_diff(self.snapshot_data, formatted_snapshot)
+                elif mode == "refs_only":
+                    output_snapshot = self._refs_only_view(formatted_snapshot)
+
+                self._update_cache(current_url, formatted_snapshot)
+                self._last_key = await self._dom_key()
+                return output_snapshot
+
+            # Fallback: the browser's precomputed AX tree over CDP.
+            start_time = time.time()
+            snapshot_text = await self._get_snapshot_cdp()
+            if snapshot_text:
+                print(
+                    f"✅ CDP Accessibility.getFullAXTree: {time.time() - start_time:.2f}s")
+                if diff_only and self.snapshot_data:
+                    return self._compute_diff(self.snapshot_data, snapshot_text)
+                return snapshot_text
+
+            # Final fallback
+            print("Warning: All snapshot methods failed, using basic fallback")
+            fallback = await self._fallback_snapshot()
+            if diff_only and self.snapshot_data:
+                fallback = self._compute_diff(self.snapshot_data, fallback)
+            return fallback
+
+        except Exception as e:
+            print(f"Error capturing snapshot: {e}")
+            return "Error: Could not capture page snapshot"
+
+    async def _get_snapshot_direct(self, all_elements: bool = False) -> Optional[str]:
+        """Capture the snapshot via page.evaluate, formatted on the JS side."""
+        js_filename = "snapshot_complete.js" if all_elements else "snapshot.js"
+
+        try:
+            if not all_elements:
+                result = await self.page.evaluate(
+                    "(fmt) => window.__a11ySnap ? window.__a11ySnap(fmt)"
+                    " : '__no_fn__'", self.snapshot_format)
+                if result != '__no_fn__':
+                    return result
+                # Late install, mirroring the sync variant.
+                await self.page.evaluate(self._install_snapshot_js())
+                return await self.page.evaluate(
+                    "(fmt) => window.__a11ySnap(fmt)", self.snapshot_format)
+            return await self.page.evaluate(
+                self._load_snapshot_js(js_filename, self.snapshot_format))
+        except Exception as e:
+            err_msg = str(e)
+            self._last_direct_error = err_msg
+            print(f"Error evaluating {js_filename}: {err_msg}")
+            return None
+
+    async def _get_cdp_session(self):
+        """Async counterpart of `PageSnapshot._get_cdp_session`."""
+        session = getattr(self, '_cdp_session', None)
+        if session is None:
+            session = await self.page.context.new_cdp_session(self.page)
+            self._cdp_session = session
+        return session
+
+    async def _get_snapshot_cdp(self) -> Optional[str]:
+        """Async counterpart of `PageSnapshot._get_snapshot_cdp`."""
+        try:
+            session = await self._get_cdp_session()
+            tree = await session.send('Accessibility.getFullAXTree')
+        except Exception as e:
+            print(f"CDP snapshot failed: {e}")
+            self._cdp_session = None
+            return None
+        return self._format_ax_nodes(tree.get('nodes') or [])
+
+    async def _fallback_snapshot(self) -> str:
+        """Fallback method when _snapshotForAI is not available"""
+        try:
+            body_text = await self.page.evaluate(
+                "() => window.__fallbackSnap ? window.__fallbackSnap() : "
+                "(document.body ? (document.body.textContent || '')"
+                ".trim().slice(0, 500) : '')")
 
             fallback_snapshot = [
                 "- Page Snapshot",
@@ -16,10 +16,11 @@ async function getSnapshotForAI(url, options = {}) {
     // Navigate to the URL with faster loading
     await page.goto(url, { waitUntil: 'domcontentloaded', timeout: 15000 });
     
-    // Optimized wait - shorter timeout for network idle
-    await page.waitForLoadState('networkidle', { timeout: 5000 }).catch(() => {
-      console.log('Network idle timeout, proceeding anyway...');
-    });
+    // networkidle stalls for the full timeout on pages with long-polling
+    // or analytics heartbeats; a bounded readiness check is enough here.
+    await page.waitForFunction(
+      "document.readyState === 'complete' || document.body.childElementCount > 0",
+      { timeout: 500 }).catch(() => {});
     
     // Use the internal _snapshotForAI method
     // This is an internal Playwright method available on the page object
@@ -142,19 +143,24 @@ async function addAriaRefAttributes(page, snapshot) {
       }
     }
     
-    // Add aria-ref attributes to matching elements
+    // Add aria-ref attributes in a single DOM traversal: one
+    // querySelectorAll pass with each element's trimmed text read once,
+    // instead of a full re-scan (plus textContent walk) per mapping.
     await page.evaluate((mappings) => {
-      for (const mapping of mappings) {
-        // Try to find elements by text content
-        const elements = Array.from(document.querySelectorAll('*')).filter(el => {
-          const text = el.textContent?.trim();
-          return text && text.includes(mapping.text.substring(0, 20)); // Partial match
-        });
-        
-        // If found, add aria-ref to the first matching element
-        if (elements.length > 0) {
-          const element = elements[0];
-          element.setAttribute('aria-ref', mapping.ref);
+      const remaining = mappings.map(m => ({
+        ref: m.ref,
+        needle: m.text.substring(0, 20) // Partial match
+      }));
+      for (const el of document.querySelectorAll('*')) {
+        if (remaining.length === 0) break;
+        const text = el.textContent?.trim();
+        if (!text) continue;
+        for (let i = 0; i < remaining.length; i++) {
+          if (text.includes(remaining[i].needle)) {
+            el.setAttribute('aria-ref', remaining[i].ref);
+            remaining.splice(i, 1);
+            break;
+          }
         }
       }
     }, refMappings);
@@ -174,19 +180,23 @@ async function addAriaRefFromMapping(page, refMapping) {
       ...info
     }));
     
+    // Same single-pass strategy as addAriaRefAttributes above.
     await page.evaluate((mappings) => {
-      for (const mapping of mappings) {
-        // Try to find elements by text content
-        if (mapping.name) {
-          const elements = Array.from(document.querySelectorAll('*')).filter(el => {
-            const text = el.textContent?.trim();
-            return text && text.includes(mapping.name.substring(0, 20)); // Partial match
-          });
-          
-          // If found, add aria-ref to the first matching element
-          if (elements.length > 0) {
-            const element = elements[0];
-            element.setAttribute('aria-ref', mapping.ref);
+      const remaining = mappings
+        .filter(m => m.name)
+        .map(m => ({
+          ref: m.ref,
+          needle: m.name.substring(0, 20) // Partial match
+        }));
+      for (const el of document.querySelectorAll('*')) {
+        if (remaining.length === 0) break;
+        const text = el.textContent?.trim();
+        if (!text) continue;
+        for (let i = 0; i < remaining.length; i++) {
+          if (text.includes(remaining[i].needle)) {
+            el.setAttribute('aria-ref', remaining[i].ref);
+            remaining.splice(i, 1);
+            break;
           }
         }
       }
@@ -248,6 +258,65 @@ async function getSnapshotFromCDP(cdpEndpoint) {
   }
 }
 
+/**
+ * Long-lived worker mode: one Playwright browser stays open and requests
+ * arrive as newline-delimited JSON on stdin ({"cmd":"snapshot","url":...}),
+ * each answered with one JSON line on stdout. Avoids paying node startup
+ * plus browser launch (~hundreds of ms) per snapshot.
+ */
+async function runServer() {
+  const readline = await import('readline');
+  const browser = await chromium.launch({ headless: true });
+  const rl = readline.createInterface({ input: process.stdin });
+
+  const reply = (obj) => process.stdout.write(JSON.stringify(obj) + '\n');
+
+  rl.on('line', async (line) => {
+    let request;
+    try {
+      request = JSON.parse(line);
+    } catch (error) {
+      reply({ success: false, error: 'bad request: ' + error.message });
+      return;
+    }
+    if (request.cmd !== 'snapshot' || !request.url) {
+      reply({ success: false, error: 'unknown command' });
+      return;
+    }
+    let context = null;
+    try {
+      context = await browser.newContext();
+      const page = await context.newPage();
+      await page.goto(request.url, { waitUntil: 'domcontentloaded', timeout: 15000 });
+      await page.waitForFunction(
+        "document.readyState === 'complete' || document.body.childElementCount > 0",
+        { timeout: 500 }).catch(() => {});
+
+      let snapshot;
+      try {
+        snapshot = await page._snapshotForAI();
+        await addAriaRefAttributes(page, snapshot);
+      } catch (error) {
+        const accessibilitySnapshot = await page.accessibility.snapshot();
+        if (!accessibilitySnapshot) throw error;
+        const refMapping = new Map();
+        snapshot = formatAccessibilitySnapshot(accessibilitySnapshot, 0, page, refMapping);
+        await addAriaRefFromMapping(page, refMapping);
+      }
+      reply({ success: true, snapshot });
+    } catch (error) {
+      reply({ success: false, error: error.message });
+    } finally {
+      if (context) await context.close().catch(() => {});
+    }
+  });
+
+  rl.on('close', async () => {
+    await browser.close().catch(() => {});
+    process.exit(0);
+  });
+}
+
 // Command line interface
 if (process.argv.length > 2) {
   const command = process.argv[2];
@@ -281,9 +350,14 @@ if (process.argv.length > 2) {
       .catch(error => {
         console.log(JSON.stringify({ success: false, error: error.message }));
       });
+  } else if (command === '--server') {
+    runServer().catch(error => {
+      console.error('Server failed:', error.message);
+      process.exit(1);
+    });
   } else {
     console.error('Unknown command:', command);
-    console.error('Available commands: snapshot, snapshot-cdp');
+    console.error('Available commands: snapshot, snapshot-cdp, --server');
     process.exit(1);
   }
 }